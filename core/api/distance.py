@@ -0,0 +1,52 @@
+import numpy as np
+from geopy.distance import geodesic
+
+# mean Earth radius, as used by geopy's great_circle
+EARTH_RADIUS_KM = 6371.0088
+
+# length of one degree of latitude
+KM_PER_DEGREE = 111.32
+
+# candidates re-measured with geodesic after the haversine pass
+REFINE_TOP_K = 3
+
+
+def haversine_km(lat, lon, lats, lons):
+    """
+    Great-circle distances in km from one point to arrays of points,
+    computed for all candidates at once.
+    """
+    lat, lon = np.radians(lat), np.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = (np.sin((lats - lat) / 2) ** 2
+         + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def nearest_candidate(origin, lats, lons, refine_top_k=REFINE_TOP_K):
+    """
+    Returns (index, distance in km) of the candidate nearest to origin.
+    Haversine ranks every candidate; the closest refine_top_k are then
+    re-measured with the exact geodesic so the reported distance matches
+    geopy. Pass refine_top_k=0 to skip the refinement.
+    """
+    distances = haversine_km(origin[0], origin[1], np.asarray(lats, dtype=float), np.asarray(lons, dtype=float))
+    if not refine_top_k:
+        index = int(np.argmin(distances))
+        return index, float(distances[index])
+
+    k = min(refine_top_k, len(distances))
+    closest = np.argpartition(distances, k - 1)[:k]
+    refined = [(geodesic(origin, (lats[i], lons[i])).km, int(i)) for i in closest]
+    distance, index = min(refined)
+    return index, distance
+
+
+def bounding_box(lat, lon, radius_km):
+    """
+    ((min_lat, max_lat), (min_lon, max_lon)) of a box containing every point
+    within radius_km of (lat, lon), for prefiltering with indexed range queries.
+    """
+    lat_delta = radius_km / KM_PER_DEGREE
+    lon_delta = radius_km / (KM_PER_DEGREE * max(np.cos(np.radians(lat)), 0.01))
+    return (lat - lat_delta, lat + lat_delta), (lon - lon_delta, lon + lon_delta)
@@ -0,0 +1,125 @@
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+NOMINATIM_SEARCH_URL = "https://nominatim.openstreetmap.org/search"
+
+# Nominatim's usage policy allows at most one request per second
+NOMINATIM_RATE_LIMIT = 1.0  # requests per second
+
+CONNECT_TIMEOUT = 3.05  # seconds
+READ_TIMEOUT = 10  # seconds
+POOL_SIZE = 10
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens are added per second up to
+    `capacity`, and acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the
+    function, every caller that arrives while it is running waits for and
+    shares its result (or exception).
+    """
+
+    class Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self.Call()
+
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = function()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+
+class GeocodingClient:
+    """
+    Shared Nominatim client: one pooled requests.Session, connect/read
+    timeouts on every request, a token bucket honouring the rate limit and
+    single-flight coalescing of identical in-flight searches.
+    """
+
+    def __init__(self, search_url=NOMINATIM_SEARCH_URL, rate_limit=NOMINATIM_RATE_LIMIT,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, pool_size=POOL_SIZE):
+        self.search_url = search_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.limiter = TokenBucket(rate_limit)
+        self.single_flight = SingleFlight()
+
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = "YourAppName/1.0"  # Required by Nominatim
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def search(self, query, **params):
+        params = {"q": query, "format": "json", **params}
+        key = tuple(sorted((name, str(value)) for name, value in params.items()))
+        return self.single_flight.do(key, lambda: self._get(params))
+
+    def _get(self, params):
+        self.limiter.acquire()
+        start = time.time()
+        response = self.session.get(self.search_url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        logger.debug("Nominatim search took %.3f seconds", time.time() - start)
+        return response.json()
+
+
+geocoding_client = GeocodingClient(
+    search_url=getattr(settings, 'NOMINATIM_SEARCH_URL', NOMINATIM_SEARCH_URL),
+    rate_limit=getattr(settings, 'NOMINATIM_RATE_LIMIT', NOMINATIM_RATE_LIMIT),
+)
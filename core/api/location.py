@@ -1,115 +1,286 @@
+import re
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 
-import requests
-from geopy.distance import geodesic
+from django.conf import settings
+from django.utils import timezone
+
+from core.api.distance import nearest_candidate
+from core.api.geocoding import geocoding_client
+from core.api.poi_index import get_poi_index
+from core.models import GeocodeCache
+
+# in-process cache, checked before the GeocodeCache table
+MEMORY_CACHE_SIZE = 1024
+MEMORY_CACHE_TTL = 60 * 60  # seconds
+
+# rows of the GeocodeCache table older than this are refetched
+DATABASE_CACHE_TTL = timedelta(days=30)
+
+# store searches run concurrently on at most this many threads
+MAX_SEARCH_WORKERS = 4
+
+# store searches are centred on the origin snapped to this many degrees, so users
+# living close to each other share cached searches
+SEARCH_GRID = 0.01
+
+
+def normalize_query(query):
+    # lowercase and tidy whitespace around commas so equivalent spellings share a cache entry
+    parts = [re.sub(r'\s+', ' ', part).strip() for part in str(query).lower().split(',')]
+    return ', '.join(part for part in parts if part)
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire `ttl` seconds after being set.
+    """
+
+    def __init__(self, max_size=MEMORY_CACHE_SIZE, ttl=MEMORY_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        # returns (found, value) so cached empty results are told apart from misses
+        with self._lock:
+            if key not in self._entries:
+                return False, None
+            expires_at, value = self._entries[key]
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class GeocodeCacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.memory_hits = 0
+        self.database_hits = 0
+        self.misses = 0
+
+    def record(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def as_dict(self):
+        return {'memory_hits': self.memory_hits, 'database_hits': self.database_hits, 'misses': self.misses}
+
+
+memory_cache = TTLCache()
+cache_stats = GeocodeCacheStats()
+
+
+def cache_key(query, params):
+    return "|".join([normalize_query(query)] + [f"{name}={params[name]}" for name in sorted(params)])
+
+
+def cached_search(query, **params):
+    """
+    Runs a Nominatim search through the two cache tiers: the in-process
+    TTLCache first, then the GeocodeCache table, and only then the network.
+    Results are keyed by the normalized query plus any extra search params.
+    """
+    result = cached_search_many([(query, params)])[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def cached_search_many(searches, max_workers=None):
+    """
+    Batch version of cached_search for a list of (query, params) pairs.
+    Cache lookups are done up front on the calling thread, then the misses
+    are fetched concurrently over a bounded thread pool; the shared client's
+    rate limit still applies across all of them. Returns the results in the
+    order of `searches`, with the exception in place of a failed search.
+    """
+    keys = [cache_key(query, params) for query, params in searches]
+    results = {}
+
+    for key in keys:
+        found, cached = memory_cache.get(key)
+        if found:
+            cache_stats.record('memory_hits')
+            results[key] = cached
+
+    pending = [key for key in keys if key not in results]
+    if pending:
+        fresh_after = timezone.now() - DATABASE_CACHE_TTL
+        for cached in GeocodeCache.objects.filter(query__in=pending, updated_at__gte=fresh_after):
+            cache_stats.record('database_hits')
+            memory_cache.set(cached.query, cached.response)
+            results[cached.query] = cached.response
+
+    misses = {}
+    for key, (query, params) in zip(keys, searches):
+        if key not in results and key not in misses:
+            misses[key] = (query, params)
+
+    if misses:
+        def search(miss):
+            query, params = miss
+            try:
+                return geocoding_client.search(query, **params)
+            except Exception as e:
+                return e
+
+        workers = min(max_workers or MAX_SEARCH_WORKERS, len(misses))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            fetched = dict(zip(misses, pool.map(search, misses.values())))
+
+        for key, result in fetched.items():
+            cache_stats.record('misses')
+            results[key] = result
+            if not isinstance(result, Exception):
+                GeocodeCache.objects.update_or_create(query=key, defaults={'response': result})
+                memory_cache.set(key, result)
+
+    return [results[key] for key in keys]
+
+
+def error_response(message):
+    return {
+        'address': message,
+        'full_address': message,
+        'distance': 0,
+        'latitude': None,
+        'longitude': None
+    }
 
 
 class Location:
+    @staticmethod
+    def geocode(address):
+        # (lat, lon) of the address through the geocode cache, or None if it cannot be geocoded
+        geocode_data = cached_search(address)
+        if not geocode_data:
+            return None
+        return float(geocode_data[0]['lat']), float(geocode_data[0]['lon'])
+
     @staticmethod
     def get_nearest_location(address, store):
+        return Location.get_nearest_locations(address, [store])[store]
+
+    @staticmethod
+    def get_nearest_locations(address, stores, raise_errors=False):
+        """
+        Finds the nearest location of every store to the address. The address
+        is geocoded once and the store searches run concurrently. Returns a
+        dict mapping each store name to its address/full_address/distance.
+        Lookup failures are reported in that dict, or raised if raise_errors.
+        """
         # Step 1: Geocode the address
-        geocode_url = "https://nominatim.openstreetmap.org/search"
         try:
-            start = time.time()
-            geocode_response = requests.get(
-                geocode_url,
-                params={"q": address, "format": "json"},
-                headers={"User-Agent": "YourAppName/1.0"}  # Required by Nominatim
-            )
-            geocode_response.raise_for_status()
-            geocode_data = geocode_response.json()
-            print(f"Geocode took {time.time() - start} seconds")
+            geocode_data = cached_search(address)
         except Exception as e:
+            if raise_errors:
+                raise
             # return f"Geocoding error: {e}"
-            return {
-                'address': f'Geocoding error: {e}',
-                'full_address': f'Geocoding error: {e}',
-                'distance': 0
-            },
+            return {store: error_response(f'Geocoding error: {e}') for store in stores}
 
         if not geocode_data:
-            return {
-                'address': 'Could not geocode the provided address.',
-                'full_address': 'Could not geocode the provided address.',
-                'distance': 0
-            },
+            return {store: error_response('Could not geocode the provided address.') for store in stores}
 
         user_lat = float(geocode_data[0]['lat'])
         user_lon = float(geocode_data[0]['lon'])
         user_coords = (user_lat, user_lon)
 
-        # Step 2: Search for "location" nearby
-        search_url = "https://nominatim.openstreetmap.org/search"
-        try:
-            radius = 0.5
-            viewbox = f"{user_lon - radius},{user_lat - radius},{user_lon + radius},{user_lat + radius}"
-            start = time.time()
-            search_response = requests.get(
-                search_url,
-                params={
-                    "q": store,
-                    "format": "json",
-                    "lat": user_lat,
-                    "lon": user_lon,
-                    "bounded": 1,
-                    "viewbox": viewbox
-                },
-                headers={"User-Agent": "YourAppName/1.0"}
-            )
-            search_response.raise_for_status()
-            search_data = search_response.json()
-            print(f"Search took {time.time() - start} seconds")
-        except Exception as e:
-            return f"Search error: {e}"
+        # Step 2: Search for every store nearby
+        radius = 0.5
+        if settings.LOCATION_BACKEND == 'poi_index':
+            # answered in-process from the offline index built by `manage.py import_pois`
+            try:
+                index = get_poi_index()
+            except OSError as e:
+                if raise_errors:
+                    raise
+                return {store: error_response(f'POI index unavailable: {e}') for store in stores}
+            search_results = [index.search(store, user_lat, user_lon, radius) for store in stores]
+        else:
+            grid_lat = round(round(user_lat / SEARCH_GRID) * SEARCH_GRID, 6)
+            grid_lon = round(round(user_lon / SEARCH_GRID) * SEARCH_GRID, 6)
+            viewbox = f"{grid_lon - radius},{grid_lat - radius},{grid_lon + radius},{grid_lat + radius}"
+            search_params = {"lat": grid_lat, "lon": grid_lon, "bounded": 1, "viewbox": viewbox}
+            search_results = cached_search_many([(store, search_params) for store in stores])
 
+        response = {}
+        for store, search_data in zip(stores, search_results):
+            if isinstance(search_data, Exception):
+                if raise_errors:
+                    raise search_data
+                response[store] = error_response(f'Search error: {search_data}')
+            else:
+                response[store] = Location.nearest(user_coords, search_data)
+        return response
+
+    @staticmethod
+    def nearest(user_coords, search_data):
         if not search_data:
             # return f"No {store} found nearby."
             response = {
                 'address': 'Not nearby',
                 'full_address': 'Not nearby',
-                'distance': 0
+                'distance': 0,
+                'latitude': None,
+                'longitude': None
             }
             return response
         # Step 3: Find nearest location
-        nearest_location = None
-        min_distance = float('inf')
-
-        start = time.time()
+        candidates, lats, lons = [], [], []
         for location in search_data:
             try:
                 location_lat = float(location['lat'])
                 location_lon = float(location['lon'])
-                location_coords = (location_lat, location_lon)
-                distance = geodesic(user_coords, location_coords).km
-
-                if distance < min_distance:
-                    min_distance = distance
-                    nearest_location = location
             except (KeyError, ValueError):
                 continue  # Skip entries with missing/invalid coordinates
-        print(f"Distance calculation took {time.time() - start} seconds")
+            candidates.append(location)
+            lats.append(location_lat)
+            lons.append(location_lon)
+
+        nearest_location = None
+        if candidates:
+            index, min_distance = nearest_candidate(user_coords, lats, lons)
+            nearest_location = candidates[index]
+            nearest_coords = (lats[index], lons[index])
 
         # Step 4: Return result
         if nearest_location:
             response = {
+                'name': nearest_location.get('display_name').split(',')[0].strip(),
                 'address': " ".join((nearest_location.get('display_name').split(',')[1:3])),
                 'full_address': " ".join(nearest_location.get('display_name').split(',')),
-                'distance': round(min_distance, 2)
+                'distance': round(min_distance, 2),
+                'latitude': nearest_coords[0],
+                'longitude': nearest_coords[1]
             }
             return response
         else:
             response = {
                 'address': None,
                 'full_address': None,
-                'distance': None
+                'distance': None,
+                'latitude': None,
+                'longitude': None
             }
             return response
-
-
-if __name__ == "__main__":
-    address_input = "9201 University City Blvd, Charlotte, NC 28223"
-    store_input = "Walmart"
-    start = time.time()
-    nearest_address = Location.get_nearest_location(address_input, store_input)
-    print(f"Total process took {time.time() - start} seconds")
-    print(f"The {store_input} location to {address_input} is likely:\n{nearest_address['full_address']}\n")
@@ -0,0 +1,148 @@
+import csv
+import json
+import math
+import pickle
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+
+# grid cells are this many degrees on each side
+CELL_SIZE = 0.1
+
+# store searches are bounded to this many degrees around the origin, like the Nominatim viewbox
+SEARCH_RADIUS = 0.5
+
+
+def name_key(name):
+    return " ".join(str(name).lower().split())
+
+
+def display_name(name, properties):
+    # same "name, street, city, state, postcode" layout as Nominatim's display_name
+    street = " ".join(part for part in [properties.get('addr:housenumber'), properties.get('addr:street')] if part)
+    parts = [name, street, properties.get('addr:city'), properties.get('addr:state'), properties.get('addr:postcode')]
+    return ", ".join(part for part in parts if part)
+
+
+class PoiIndex:
+    """
+    In-process spatial index of store POIs. Each POI is filed under its
+    normalized name and brand, then into a CELL_SIZE degree grid bucket, so a
+    nearest-store query only looks at the buckets around the origin.
+    """
+
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.display_names = []
+        self.lats = []
+        self.lons = []
+        self.cells = defaultdict(lambda: defaultdict(list))
+
+    def cell(self, lat, lon):
+        return math.floor(lat / self.cell_size), math.floor(lon / self.cell_size)
+
+    def add(self, name, lat, lon, display, brand=None):
+        poi_id = len(self.lats)
+        self.display_names.append(display)
+        self.lats.append(lat)
+        self.lons.append(lon)
+        for key in {name_key(name), name_key(brand or name)}:
+            self.cells[key][self.cell(lat, lon)].append(poi_id)
+
+    def __len__(self):
+        return len(self.lats)
+
+    def search(self, store, lat, lon, radius=SEARCH_RADIUS):
+        """
+        Returns the POIs named `store` within `radius` degrees of (lat, lon),
+        shaped like Nominatim search results.
+        """
+        buckets = self.cells.get(name_key(store))
+        if not buckets:
+            return []
+
+        row, column = self.cell(lat, lon)
+        reach = math.ceil(radius / self.cell_size)
+        results = []
+        for i in range(row - reach, row + reach + 1):
+            for j in range(column - reach, column + reach + 1):
+                for poi_id in buckets.get((i, j), ()):
+                    if abs(self.lats[poi_id] - lat) <= radius and abs(self.lons[poi_id] - lon) <= radius:
+                        results.append({'lat': self.lats[poi_id], 'lon': self.lons[poi_id],
+                                        'display_name': self.display_names[poi_id]})
+        return results
+
+    def save(self, path):
+        data = {
+            'cell_size': self.cell_size,
+            'display_names': self.display_names,
+            'lats': self.lats,
+            'lons': self.lons,
+            'cells': {key: dict(buckets) for key, buckets in self.cells.items()},
+        }
+        with open(path, 'wb') as file:
+            pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as file:
+            data = pickle.load(file)
+        index = cls(cell_size=data['cell_size'])
+        index.display_names = data['display_names']
+        index.lats = data['lats']
+        index.lons = data['lons']
+        for key, buckets in data['cells'].items():
+            index.cells[key].update(buckets)
+        return index
+
+    @classmethod
+    def from_csv(cls, path):
+        # columns: name, lat, lon and optionally brand, display_name or the addr:* columns
+        index = cls()
+        with open(path, newline='', encoding='utf-8') as file:
+            for row in csv.DictReader(file):
+                if not row.get('name') or not row.get('lat') or not row.get('lon'):
+                    continue
+                index.add(row['name'], float(row['lat']), float(row['lon']),
+                          row.get('display_name') or display_name(row['name'], row), row.get('brand'))
+        return index
+
+    @classmethod
+    def from_geojson(cls, path):
+        # Point features with OpenStreetMap tags (name, brand, addr:*) as properties
+        index = cls()
+        with open(path, encoding='utf-8') as file:
+            features = json.load(file).get('features', [])
+        for feature in features:
+            properties = feature.get('properties') or {}
+            geometry = feature.get('geometry') or {}
+            if geometry.get('type') != 'Point' or not properties.get('name'):
+                continue
+            lon, lat = geometry['coordinates'][:2]
+            index.add(properties['name'], float(lat), float(lon),
+                      display_name(properties['name'], properties), properties.get('brand'))
+        return index
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_poi_index():
+    # loads the index built by `manage.py import_pois` once per process
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                try:
+                    _index = PoiIndex.load(settings.POI_INDEX_PATH)
+                except FileNotFoundError:
+                    raise FileNotFoundError(f'{settings.POI_INDEX_PATH} not found, '
+                                            f'build it with `manage.py import_pois`')
+    return _index
+
+
+def reset_poi_index():
+    global _index
+    _index = None
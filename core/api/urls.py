@@ -6,6 +6,8 @@ urlpatterns = [
     path('check-demo-user/', views.check_demo_user),
 
     # Dashboard APIs
+    # all dashboard cards in one request, optionally filtered with ?cards=
+    path('dashboard/', views.dashboard),
     path('todays_intake/', views.dashboard_data_todays_intake),
     path('top_n_foods/<int:count>/', views.dashboard_top_foods),
     path('top_n_stores/<int:count>/', views.dashboard_top_stores),
@@ -32,6 +34,8 @@ urlpatterns = [
     # Food and Store Database APIs
     path('food-database/', views.food_database),
     path('store-database/', views.store_database),
+    # stores within ?radius= km of the user - GET
+    path('stores/nearby/', views.nearby_stores),
 
     # Quick Add Food APIs
     path('quick-add-foods/', views.quick_add_foods),
@@ -55,7 +59,13 @@ urlpatterns = [
     path('clear-data/', views.clear_data),
 
     path('import-data/', views.import_data_from_json),
+    # rows changed since ?since=<cursor> - GET
+    path('changes/', views.changes),
     path('export-data/', views.export_data_to_json),
+    # background exports - POST to start, GET for status, download/ once done
+    path('export-jobs/', views.export_jobs),
+    path('export-jobs/<int:exportId>/', views.export_jobs),
+    path('export-jobs/<int:exportId>/download/', views.download_export),
 
     path('data/', views.exported_data),
 ]
\ No newline at end of file
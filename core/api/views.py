@@ -1,21 +1,41 @@
 import calendar
+import gzip
+import json
+import os
+import re
 import uuid
+import zlib
 from collections import defaultdict
-from datetime import date, timedelta, datetime
+from datetime import date, timedelta, datetime, time
 
-from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Q, Window, F
-from django.db.models.functions import RowNumber
+from django.core.exceptions import ValidationError
+from django.db import transaction, DatabaseError
+from django.db.models import Q, Window, F, Sum, Count, Max, Min, Value
+from django.db.models.functions import RowNumber, Coalesce, TruncMonth, Lower, Concat
+from django.http import StreamingHttpResponse, FileResponse, HttpResponse, QueryDict
 from django.shortcuts import render
 from django.utils import timezone
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
+from core.api.distance import haversine_km, bounding_box
 from core.api.location import Location
-from core.models import User, FoodEntry, Store, WaterContainer, WaterEntry, Profile, Goal
+from core.changes import get_changes, record_tombstones
+from core.exports import EXPORT_CONTENT_TYPES, EXPORT_STREAMS, EXPORT_RETENTION, export_filename, gzip_stream
+from core.imports import import_data, import_ndjson
+from core.jobs import enqueue
+from core.models import User, FoodEntry, Store, WaterContainer, WaterEntry, Profile, Goal, DailyRollup, DataExport
+from core.purge import purge_user
+from core.rollups import entry_day, refresh_daily_rollups, get_daily_rollups
 
 MULTIPLIER = 0.314159265358979
 
+# upper bound for weekly-data/<daysBack>/, a little over a year
+MAX_WEEKLY_DATA_DAYS = 400
+
+# default radius of stores/nearby/, in km
+DEFAULT_NEARBY_RADIUS = 10
+
 
 def switchHealthRatingToNumbers(rating):
     if rating == 'Unhealthy':
@@ -33,19 +53,18 @@ def get_favourite_foods(user: User, count):
 
 
 def get_favourite_stores(user: User, count):
-    return Store.objects.filter(user=user).order_by('-visits')[:count]
-
-
-def get_water_entries_from_date(user: User, date):
-    return WaterEntry.objects.filter(user=user, created_at__date=date)
-
+    return Store.objects.filter(user=user).select_related('location').order_by('-visits')[:count]
 
-def get_water_entries_from_month(user: User, month, year):
-    return WaterEntry.objects.filter(user=user, created_at__month=month, created_at__year=year).order_by('created_at')
 
-
-def get_food_entries_from_date(user: User, date):
-    return FoodEntry.objects.filter(user=user, created_at__date=date).order_by('created_at')
+def get_day_range(day, days=1):
+    """
+    Turns a local date into the half-open [start, end) datetime range covering
+    `days` days from it. Filtering created_at on this range is an index range
+    scan, unlike created_at__date which wraps the column in a date function.
+    """
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=days), time.min))
+    return start, end
 
 
 # checks if demo user exists
@@ -55,55 +74,59 @@ def check_demo_user(request):
     return Response({'exists': exists})
 
 
-# returns data for top left card of the dashboard
-@api_view(['GET'])
-def dashboard_data_todays_intake(request):
-    user = request.user
+# builds data for top left card of the dashboard
+def todays_intake_data(user: User, today):
+    yesterday = today - timedelta(days=1)
+    yesterday_start, today_start = get_day_range(yesterday)
+    today_end = get_day_range(today)[1]
+    is_today = Q(created_at__gte=today_start)
+    is_yesterday = Q(created_at__lt=today_start)
+    both_days = Q(created_at__gte=yesterday_start, created_at__lt=today_end)
 
-    # for water
-    today_water_intake = sum([log.amount for log in
-                              get_water_entries_from_date(user, date.today())])
-    yesterday_water_intake = sum([log.amount for log in
-                                  get_water_entries_from_date(user, date.today() - timedelta(days=1))])
+    # for water - today and yesterday summed in a single pass; inactive entries are left out, as on every card
+    water = WaterEntry.objects.filter(both_days, user=user, is_active=True).aggregate(
+        today=Coalesce(Sum('amount', filter=is_today), 0),
+        yesterday=Coalesce(Sum('amount', filter=is_yesterday), 0),
+    )
+    today_water_intake = water['today']
+    yesterday_water_intake = water['yesterday']
 
     water_change_percentage = ((today_water_intake - yesterday_water_intake) /
                                (yesterday_water_intake if yesterday_water_intake != 0 else 1)) * 100
 
-    # for foodx
-    today_food_log = FoodEntry.objects.filter(user=user,
-                                              created_at__date=date.today(),
-                                              is_active=True,
-                                              is_quick_add=False)
-    today_calorie_intake = sum([log.calories for log in today_food_log])
-
-    yesterday_food_log = FoodEntry.objects.filter(user=user,
-                                                  created_at__date=date.today() - timedelta(days=1),
-                                                  is_active=True,
-                                                  is_quick_add=False)
-
-    yesterday_food_intake = sum([log.calories for log in yesterday_food_log])
+    # for food, healthy foods and new stores - one conditional aggregation over both days
+    food_logs = FoodEntry.objects.filter(user=user, is_active=True, is_quick_add=False)
+    today_store_ids = food_logs.filter(is_today, created_at__lt=today_end,
+                                       purchased_from__isnull=False).values('purchased_from')
+    is_new_store = Q(purchased_from__visits=1)
+
+    food = food_logs.filter(both_days).aggregate(
+        today_calories=Coalesce(Sum('calories', filter=is_today), 0),
+        yesterday_calories=Coalesce(Sum('calories', filter=is_yesterday), 0),
+        today_healthy=Count('id', filter=is_today & Q(health_rating='3')),
+        yesterday_healthy=Count('id', filter=is_yesterday & Q(health_rating='3')),
+        today_new_stores=Count('id', filter=is_today & is_new_store),
+        yesterday_new_stores=Count('id', filter=is_yesterday & is_new_store
+                                   & ~Q(purchased_from__in=today_store_ids)),
+    )
 
+    today_calorie_intake = food['today_calories']
+    yesterday_food_intake = food['yesterday_calories']
     calorie_change_percentage = ((today_calorie_intake - yesterday_food_intake)
                                  / (yesterday_food_intake if yesterday_food_intake != 0 else 1)) * 100
 
-    # for healthy foods
-    today_healthy_food_count = sum([1 for log in today_food_log if log.health_rating == '3'])
-
-    yesterday_healthy_food_count = sum([1
-                                        for log in yesterday_food_log if log.health_rating == '3'])
+    today_healthy_food_count = food['today_healthy']
+    yesterday_healthy_food_count = food['yesterday_healthy']
     healthy_food_change_percentage = (((today_healthy_food_count - yesterday_healthy_food_count)
                                        / (yesterday_healthy_food_count if yesterday_healthy_food_count != 0 else 1))
                                       * 100)
 
-    # for new stores
-    today_new_store_count = sum([1 for log in today_food_log if log.purchased_from is not None
-                                 and log.purchased_from.visits == 1])
-    yesterday_new_store_count = sum([1 for log in yesterday_food_log if log.purchased_from is not None
-                                     and log.purchased_from not in today_food_log and log.purchased_from.visits == 1])
+    today_new_store_count = food['today_new_stores']
+    yesterday_new_store_count = food['yesterday_new_stores']
     new_store_change_percentage = ((today_new_store_count - yesterday_new_store_count)
                                    / (yesterday_new_store_count if yesterday_new_store_count != 0 else 1)) * 100
 
-    return Response({
+    return {
         'today_water_intake': today_water_intake,
         'water_change_percentage': round(water_change_percentage),
 
@@ -115,49 +138,44 @@ def dashboard_data_todays_intake(request):
 
         'today_new_store_count': today_new_store_count,
         'new_store_change_percentage': round(new_store_change_percentage)
-    })
+    }
 
 
-# returns data for middle left card of the dashboard
+# returns data for top left card of the dashboard
 @api_view(['GET'])
-def dashboard_top_foods(request, count: int):
-    user = request.user
+def dashboard_data_todays_intake(request):
+    return Response(todays_intake_data(request.user, date.today()))
 
-    # Get ALL food entries for the user
-    all_foods = FoodEntry.objects.filter(
-        user=user,
-        is_active=True,
-        is_quick_add=False
-    )
 
-    # Group by food_name
-    food_groups = defaultdict(list)
-    for food in all_foods:
-        food_groups[food.food_name].append(food)
+# builds data for middle left card of the dashboard
+def top_foods_data(user: User, count: int):
+    # Group by food_name in the database and keep the `count` most frequent foods
+    top_foods = (FoodEntry.objects.filter(user=user, is_active=True, is_quick_add=False)
+                 .values('food_name')
+                 .annotate(frequency=Count('id'), max_calorie=Max('calories'), min_calorie=Min('calories'))
+                 .order_by('-frequency', 'food_name')[:count])
 
-    # Build response with unique food_name entries
     response = []
-    for i, (food_name, logs) in enumerate(food_groups.items(), start=1):
+    for i, food in enumerate(top_foods, start=1):
         response.append({
             'id': f"{i:02}",
-            'name': food_name,
-            'frequency': len(logs),
-            'max_calorie': max(log.calories for log in logs),
-            'min_calorie': min(log.calories for log in logs),
+            'name': food['food_name'],
+            'frequency': food['frequency'],
+            'max_calorie': food['max_calorie'],
+            'min_calorie': food['min_calorie'],
         })
 
-    # Sort by frequency (descending) and take top `count`
-    response.sort(key=lambda x: x['frequency'], reverse=True)
-    top_response = response[:count]
-
-    return Response(top_response)
+    return response
 
 
-# returns data for top right card of the dashboard
+# returns data for middle left card of the dashboard
 @api_view(['GET'])
-def dashboard_top_stores(request, count):
-    user = request.user
+def dashboard_top_foods(request, count: int):
+    return Response(top_foods_data(request.user, count))
 
+
+# builds data for top right card of the dashboard
+def top_stores_data(user: User, count):
     top_n_stores = get_favourite_stores(user, count)
     popular_stores_count = sum(store.visits for store in top_n_stores)
 
@@ -166,26 +184,34 @@ def dashboard_top_stores(request, count):
     for store in top_n_stores:
         response.append({
             'name': store.name,
-            'address': store.address,
+            'address': store.location.address if store.location else None,
             'distance': store.distance,
             'visits': store.visits,
             'popularity': round((store.visits / popular_stores_count) * 100),
         })
-    return Response(response)
+    return response
 
 
-# returns data for middle right card of the dashboard
+# returns data for top right card of the dashboard
 @api_view(['GET'])
-def weekly_comparison(request):
-    user = request.user
+def dashboard_top_stores(request, count):
+    return Response(top_stores_data(request.user, count))
+
+
+# builds data for middle right card of the dashboard
+def weekly_comparison_data(user: User, today):
+    # one range query over the daily rollups of the last 14 days, split into the two weeks below
+    rollups = get_daily_rollups(user, today - timedelta(days=13), today)
+
+    def day_total(this_date):
+        return rollups[this_date].water_total if this_date in rollups else 0
 
     weekly_comparison = []
     this_week_data = []
     this_week_total = 0
     for i in range(6, -1, -1):
-        this_date = date.today() - timedelta(days=i)
-        logs = get_water_entries_from_date(user, this_date)
-        total = sum([log.amount for log in logs])
+        this_date = today - timedelta(days=i)
+        total = day_total(this_date)
         this_week_total += total
         this_week_data.append({'date': calendar.day_name[this_date.weekday()], 'total': total})
 
@@ -196,9 +222,8 @@ def weekly_comparison(request):
     past_week_data = []
     past_week_total = 0
     for i in range(7):
-        this_date = date.today() - timedelta(days=i + 7)
-        logs = get_water_entries_from_date(user, this_date)
-        total = sum([log.amount for log in logs])
+        this_date = today - timedelta(days=i + 7)
+        total = day_total(this_date)
         past_week_total += total
         past_week_data.append({'date': calendar.day_name[this_date.weekday()], 'total': total})
 
@@ -206,48 +231,63 @@ def weekly_comparison(request):
     weekly_comparison.append({'data': past_week_data})
     weekly_comparison.append({'total': past_week_total})
 
-    return Response(weekly_comparison)
+    return weekly_comparison
 
 
-# returns data for bottom left card of the dashboard
+# returns data for middle right card of the dashboard
 @api_view(['GET'])
-def today_water_intake_chart(request):
-    user = request.user
+def weekly_comparison(request):
+    return Response(weekly_comparison_data(request.user, date.today()))
 
-    today_intake = sum([log.amount for log in get_water_entries_from_date(user, date.today())])
-    same_day_last_week_intake = sum([log.amount for log in
-                                     get_water_entries_from_date(user, date.today() - timedelta(days=7))])
+
+# builds data for bottom left card of the dashboard
+def today_water_chart_data(user: User, today, goal):
+    rollups = get_daily_rollups(user, today - timedelta(days=7), today)
+    today_intake = rollups[today].water_total if today in rollups else 0
+    last_week = today - timedelta(days=7)
+    same_day_last_week_intake = rollups[last_week].water_total if last_week in rollups else 0
 
     percentage_change = ((today_intake - same_day_last_week_intake) /
                          (same_day_last_week_intake if same_day_last_week_intake != 0 else 1)) * 100
 
-    goal = Goal.objects.filter(user=user).first()
-    return Response({
+    return {
         'today_intake': today_intake,
         'same_day_last_week_intake': same_day_last_week_intake,
         'change': round(percentage_change),
         'goal': goal.water_goal if goal else 0
-    })
+    }
 
 
-# returns data for bottom right card of the dashboard
+# returns data for bottom left card of the dashboard
 @api_view(['GET'])
-def yearly_water_intake_chart(request):
-    user = request.user
+def today_water_intake_chart(request):
+    goal = Goal.objects.filter(user=request.user).first()
+    return Response(today_water_chart_data(request.user, date.today(), goal))
+
+
+# builds data for bottom right card of the dashboard
+def yearly_water_chart_data(user: User, today):
+    # first day of the month eleven months back, so the window covers twelve months
+    start_year, start_month = divmod(today.year * 12 + today.month - 1 - 11, 12)
+    start = date(start_year, start_month + 1, 1)
+    end_year, end_month = divmod(today.year * 12 + today.month, 12)
+    end = date(end_year, end_month + 1, 1)
+
+    monthly_intake = (DailyRollup.objects.filter(user=user, day__gte=start, day__lt=end)
+                      .annotate(month=TruncMonth('day'))
+                      .values('month')
+                      .annotate(intake=Sum('water_total')))
+    intake_by_month = {row['month']: row['intake'] for row in monthly_intake}
 
     month_data = []
     total_this_year = 0
-    today = date.today()
-    current_year = today.year
-    current_month = today.month
-
-    for i in range(11, -1, -1):
-        # Calculate the year and month for the current iteration
-        year = current_year - (current_month - 1 - i < 0)
-        month = (current_month - 1 - i) % 12 + 1
+    for i in range(12):
+        year, month = divmod(start.year * 12 + start.month - 1 + i, 12)
+        month_start = date(year, month + 1, 1)
 
-        month_intake = sum([log.amount for log in get_water_entries_from_month(user, month, year)])
-        month_name = calendar.month_name[month]
+        # months without any entries have no rollup rows
+        month_intake = intake_by_month.get(month_start) or 0
+        month_name = calendar.month_name[month_start.month]
         month_data.append({'month': month_name, 'intake': month_intake})
         total_this_year += month_intake
 
@@ -256,32 +296,91 @@ def yearly_water_intake_chart(request):
         'total_this_year': total_this_year
     }
 
-    return Response(this_year_data)
+    return this_year_data
+
+
+# returns data for bottom right card of the dashboard
+@api_view(['GET'])
+def yearly_water_intake_chart(request):
+    return Response(yearly_water_chart_data(request.user, date.today()))
+
+
+DASHBOARD_CARDS = ['todays_intake', 'top_n_foods', 'top_n_stores',
+                   'weekly_comparison', 'yearly_water_chart', 'today_water_chart']
+
+# upper bound for ?foods= and ?stores= of dashboard/
+MAX_DASHBOARD_COUNT = 100
+
+
+# returns data for every dashboard card in a single request
+# ?cards=todays_intake,top_n_foods selects a subset, ?foods= and ?stores= set the top n counts
+@api_view(['GET'])
+def dashboard(request):
+    user = request.user
+    today = date.today()
+
+    cards = request.query_params.get('cards')
+    cards = [card.strip() for card in cards.split(',') if card.strip()] if cards else DASHBOARD_CARDS
+    unknown_cards = [card for card in cards if card not in DASHBOARD_CARDS]
+    if unknown_cards:
+        return Response({'success': False, 'error': f"Unknown cards: {', '.join(unknown_cards)}"}, status=400)
+
+    try:
+        food_count = int(request.query_params.get('foods', 20))
+        store_count = int(request.query_params.get('stores', 10))
+    except ValueError:
+        return Response({'success': False, 'error': 'foods and stores must be integers'}, status=400)
+    if not (0 <= food_count <= MAX_DASHBOARD_COUNT and 0 <= store_count <= MAX_DASHBOARD_COUNT):
+        return Response({'success': False, 'error': f'foods and stores must be between 0 and {MAX_DASHBOARD_COUNT}'},
+                        status=400)
+
+    response = {}
+    if 'todays_intake' in cards:
+        response['todays_intake'] = todays_intake_data(user, today)
+    if 'top_n_foods' in cards:
+        response['top_n_foods'] = top_foods_data(user, food_count)
+    if 'top_n_stores' in cards:
+        response['top_n_stores'] = top_stores_data(user, store_count)
+    if 'weekly_comparison' in cards:
+        response['weekly_comparison'] = weekly_comparison_data(user, today)
+    if 'yearly_water_chart' in cards:
+        response['yearly_water_chart'] = yearly_water_chart_data(user, today)
+    if 'today_water_chart' in cards:
+        goal = Goal.objects.filter(user=user).first()
+        response['today_water_chart'] = today_water_chart_data(user, today, goal)
+
+    return Response(response)
 
 
 @api_view(['GET', 'POST', 'DELETE'])
 def food_entries(request, date=None, entryId=None):
     if request.method == 'GET':
         # date contains the date in YYYY-MM-DD format
-        entries = request.user.food_entries.filter(
-            Q(created_at__date=date) & Q(is_active=True) & Q(is_quick_add=False))
+        try:
+            start, end = get_day_range(datetime.strptime(date, '%Y-%m-%d').date())
+        except ValueError:
+            return Response({'success': False, 'error': 'date must be in YYYY-MM-DD format'}, status=400)
+
+        entries = (request.user.food_entries
+                   .filter(Q(created_at__gte=start) & Q(created_at__lt=end) & Q(is_active=True) & Q(is_quick_add=False))
+                   .values('entry_id', 'food_name', 'calories', 'purchased', 'health_rating', 'meal_type', 'notes',
+                           'protein', 'carbs', 'fat', 'purchased_from__name'))
         response = []
 
         for entry in entries:
             response.append({
-                'id': entry.entry_id,
-                'foodName': entry.food_name,
-                'calories': entry.calories,
-                'purchased': entry.purchased,
-                'healthRating': entry.health_rating,
-                'mealType': entry.meal_type,
-                'notes': entry.notes,
-                'protein': entry.protein,
-                'carbs': entry.carbs,
-                'fat': entry.fat,
-                'store': entry.purchased_from.name if entry.purchased_from else None
+                'id': entry['entry_id'],
+                'foodName': entry['food_name'],
+                'calories': entry['calories'],
+                'purchased': entry['purchased'],
+                'healthRating': entry['health_rating'],
+                'mealType': entry['meal_type'],
+                'notes': entry['notes'],
+                'protein': entry['protein'],
+                'carbs': entry['carbs'],
+                'fat': entry['fat'],
+                'store': entry['purchased_from__name']
             })
-            print('Entry: ', response if entry.food_name == 'Burger' else None)
         return Response(response)
 
     elif request.method == 'POST':
@@ -306,25 +405,28 @@ def food_entries(request, date=None, entryId=None):
         if data.get('store'):
             store, store_created = Store.objects.get_or_create(user=request.user, name=data.get('store'))
             if store_created:
-                address = Location.get_nearest_location(request.user.full_address, data.get('store'))
+                # address and distance are filled in by the locate_store job (manage.py run_jobs)
                 store.name = data.get('store')
                 store.visits = 1
                 store.user = request.user
-                store.address = address['address']
-                store.distance = address['distance']
+                store.location_status = 'pending'
                 store.save()
+                enqueue('locate_store', {'store_id': store.id})
             else:
                 store.visits += 1
                 store.save()
             entry.purchased_from = store
 
+        previous_day = entry_day(entry)
         if entry_created:
             entry.frequency = 1
         else:
             entry.frequency += 1
             entry.created_at = timezone.now()
 
-        entry.save()
+        with transaction.atomic():
+            entry.save()
+            refresh_daily_rollups(request.user, previous_day, entry_day(entry))
         return Response({'success': True})
 
     elif request.method == 'DELETE':
@@ -333,7 +435,10 @@ def food_entries(request, date=None, entryId=None):
         if entry.purchased_from:
             entry.purchased_from.visits -= 1
             entry.purchased_from.save()
-        entry.delete()
+        with transaction.atomic():
+            record_tombstones(request.user, 'food_entries', [entry.id])
+            entry.delete()
+            refresh_daily_rollups(request.user, entry_day(entry))
         return Response({'success': True})
 
     return Response({'success': False})
@@ -342,52 +447,91 @@ def food_entries(request, date=None, entryId=None):
 @api_view(['GET', 'POST', 'DELETE'])
 def water_entries(request, date=None, entryId=None):
     if request.method == 'GET':
-        print(date)
-        entries = request.user.water_entries.filter(Q(created_at__date=date) & Q(is_active=True))
+        try:
+            start, end = get_day_range(datetime.strptime(date, '%Y-%m-%d').date())
+        except ValueError:
+            return Response({'success': False, 'error': 'date must be in YYYY-MM-DD format'}, status=400)
+
+        entries = (request.user.water_entries
+                   .filter(Q(created_at__gte=start) & Q(created_at__lt=end) & Q(is_active=True))
+                   .values('entry_id', 'amount', 'created_at'))
         response = []
         for entry in entries:
             response.append({
-                'id': entry.entry_id,
-                'amount': entry.amount,
-                'timestamp': entry.created_at
+                'id': entry['entry_id'],
+                'amount': entry['amount'],
+                'timestamp': entry['created_at']
             })
         return Response(response)
     elif request.method == 'POST':
         data = request.data
-        WaterEntry.objects.create(
-            user=request.user,
-            amount=data.get('amount')
-        )
+        with transaction.atomic():
+            entry = WaterEntry.objects.create(
+                user=request.user,
+                amount=data.get('amount')
+            )
+            refresh_daily_rollups(request.user, entry_day(entry))
 
         return Response({"success": True})
     elif request.method == 'DELETE':
-        request.user.water_entries.get(entry_id=entryId).delete()
+        entry = request.user.water_entries.get(entry_id=entryId)
+        with transaction.atomic():
+            record_tombstones(request.user, 'water_entries', [entry.id])
+            entry.delete()
+            refresh_daily_rollups(request.user, entry_day(entry))
         return Response({"success": True})
     return Response({"success": False})
 
 
 @api_view(['GET'])
 def food_database(request):
+    # ?q= returns only foods whose name starts with q (case-insensitive), ?limit= caps the number of foods
     if request.method == 'GET':
-        results = request.user.food_entries.all()
+        try:
+            limit = int(request.query_params['limit']) if request.query_params.get('limit') else None
+        except ValueError:
+            return Response({'success': False, 'error': 'limit must be an integer'}, status=400)
+
+        results = FoodEntry.objects.filter(user=request.user)
+
+        query = request.query_params.get('q', '').strip()
+        if query:
+            # a range on the lowercased name can use the (user, lower(food_name)) index, unlike LIKE.
+            # The query is lowercased by the database too, so both sides are folded alike (SQLite's
+            # LOWER() only folds ASCII), and U+10FFFF sorts after any character following the prefix.
+            prefix = Lower(Value(query))
+            results = results.annotate(name_lower=Lower('food_name')).filter(
+                name_lower__gte=prefix, name_lower__lt=Concat(prefix, Value('\U0010ffff')))
+
+        # keep only the latest entry of each food name
+        results = (results.annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=[F('food_name')],
+                order_by=F('created_at').desc()
+            )
+        ).filter(
+            row_number=1
+        ).select_related('purchased_from').order_by('food_name'))
+
+        if limit is not None:
+            results = results[:max(limit, 0)]
+
         response = []
-        already_added = []
         for result in results:
-            if result.food_name not in already_added:
-                response.append({
-                    'id': result.entry_id,
-                    'name': result.food_name,
-                    'calories': result.calories,
-                    'purchased': result.purchased,
-                    'healthRating': result.health_rating,
-                    'mealType': result.meal_type,
-                    'notes': result.notes,
-                    'protein': result.protein,
-                    'carbs': result.carbs,
-                    'fat': result.fat,
-                    'store': result.purchased_from.name if result.purchased_from else None
-                })
-                already_added.append(result.food_name)
+            response.append({
+                'id': result.entry_id,
+                'name': result.food_name,
+                'calories': result.calories,
+                'purchased': result.purchased,
+                'healthRating': result.health_rating,
+                'mealType': result.meal_type,
+                'notes': result.notes,
+                'protein': result.protein,
+                'carbs': result.carbs,
+                'fat': result.fat,
+                'store': result.purchased_from.name if result.purchased_from else None
+            })
         return Response(response)
     return Response({'success': False})
 
@@ -406,6 +550,53 @@ def store_database(request):
     return Response({'success': False})
 
 
+# returns the user's stores within ?radius= km of their current location, nearest first.
+# The location is ?lat=&lon= when given, otherwise the user's geocoded address.
+@api_view(['GET'])
+def nearby_stores(request):
+    try:
+        radius = float(request.query_params.get('radius', DEFAULT_NEARBY_RADIUS))
+        if request.query_params.get('lat') and request.query_params.get('lon'):
+            origin = (float(request.query_params['lat']), float(request.query_params['lon']))
+        else:
+            origin = None
+    except ValueError:
+        return Response({'success': False, 'error': 'radius, lat and lon must be numbers'}, status=400)
+
+    if origin is None:
+        try:
+            origin = Location.geocode(request.user.full_address)
+        except Exception as e:
+            return Response({'success': False, 'error': f'Geocoding error: {e}'}, status=502)
+        if origin is None:
+            return Response({'success': False, 'error': 'Could not geocode the provided address.'}, status=400)
+
+    # one indexed bounding-box query, then exact distances for all candidates in one vectorized pass
+    lat_range, lon_range = bounding_box(origin[0], origin[1], radius)
+    stores = list(Store.objects.filter(user=request.user, location__latitude__range=lat_range,
+                                       location__longitude__range=lon_range)
+                  .values('name', 'visits', 'location__address', 'location__latitude', 'location__longitude'))
+    if not stores:
+        return Response([])
+
+    distances = haversine_km(origin[0], origin[1], [store['location__latitude'] for store in stores],
+                             [store['location__longitude'] for store in stores])
+
+    response = []
+    for store, distance in zip(stores, distances):
+        if distance <= radius:
+            response.append({
+                'name': store['name'],
+                'address': store['location__address'],
+                'visits': store['visits'],
+                'latitude': store['location__latitude'],
+                'longitude': store['location__longitude'],
+                'distance': round(float(distance), 2),
+            })
+    response.sort(key=lambda store: store['distance'])
+    return Response(response)
+
+
 @api_view(['GET', 'POST', 'DELETE'])
 def quick_add_foods(request, itemId=None):
     if request.method == 'GET':
@@ -524,34 +715,45 @@ def water_containers(request, containerId=None):
 @api_view(['GET'])
 def weekly_data(request, daysBack):
     daysBack = int(daysBack)
+    if daysBack > MAX_WEEKLY_DATA_DAYS:
+        return Response({'success': False, 'error': f'daysBack cannot exceed {MAX_WEEKLY_DATA_DAYS}'}, status=400)
+
     if request.method == 'GET':
         result = []
         today = date.today()
+
+        # one range scan over the whole window, bucketed by day below
+        start, end = get_day_range(today - timedelta(days=daysBack - 1), days=daysBack)
+        entries = (FoodEntry.objects
+                   .filter(user=request.user, created_at__gte=start, created_at__lt=end)
+                   .select_related('purchased_from')
+                   .only('entry_id', 'food_name', 'calories', 'purchased', 'health_rating', 'meal_type', 'notes',
+                         'protein', 'carbs', 'fat', 'created_at', 'purchased_from__name')
+                   .order_by('created_at'))
+        entries_by_day = defaultdict(list)
+        for entry in entries:
+            entries_by_day[entry_day(entry)].append({
+                'id': entry.entry_id,
+                'foodName': entry.food_name,
+                'calories': entry.calories,
+                'purchased': entry.purchased,
+                'healthRating': entry.health_rating,
+                'mealType': entry.meal_type,
+                'notes': entry.notes,
+                'protein': entry.protein,
+                'carbs': entry.carbs,
+                'fat': entry.fat,
+                'store': entry.purchased_from.name if entry.purchased_from else None,
+                'createdAt': entry.created_at.strftime('%A'),
+            })
+
         for i in range(daysBack - 1, -1, -1):
             loop_date = today - timedelta(days=i)
             dateKey = loop_date.strftime('%Y-%m-%d')
-            entries = request.user.food_entries.filter(Q(created_at__date=loop_date))
-            entry_result = []
-            for entry in entries:
-                entry_result.append({
-                    'id': entry.entry_id,
-                    'foodName': entry.food_name,
-                    'calories': entry.calories,
-                    'purchased': entry.purchased,
-                    'healthRating': entry.health_rating,
-                    'mealType': entry.meal_type,
-                    'notes': entry.notes,
-                    'protein': entry.protein,
-                    'carbs': entry.carbs,
-                    'fat': entry.fat,
-                    'store': entry.purchased_from.name if entry.purchased_from else None,
-                    'createdAt': entry.created_at.strftime('%A'),
-                })
-
             result.append({
                 'date': dateKey,
                 'displayDate': loop_date.strftime('%b %d'),
-                'entries': entry_result
+                'entries': entries_by_day[loop_date]
             })
         return Response(result)
 
@@ -620,238 +822,210 @@ def settings(request):
 @api_view(['GET'])
 def clear_data(request):
     if request.method == 'GET':
-        # Delete all existing entries
-
-        WaterEntry.objects.filter(user=request.user).delete()
-        WaterEntry.objects.filter(user=request.user).delete()
-        FoodEntry.objects.filter(user=request.user).delete()
-        Store.objects.filter(user=request.user).delete()
-        Profile.objects.filter(user=request.user).delete()
-        Goal.objects.filter(user=request.user).delete()
-        WaterContainer.objects.filter(user=request.user).delete()
-        request.user.delete()
+        # Delete the account and all existing entries, a batch at a time
+        purge_user(request.user)
 
         return Response({"success": True})
     return Response({"success": False})
 
 
+# returns rows of the user's entries, containers, goals and stores changed since ?since=<cursor>,
+# with tombstones of deleted rows. Without a cursor every row is returned, a page at a time.
+@api_view(['GET'])
+def changes(request):
+    try:
+        return Response(get_changes(request.user, request.query_params.get('since')))
+    except ValueError as e:
+        return Response({'success': False, 'error': str(e)}, status=400)
+
+
+def accepts_gzip(request):
+    # gzip listed in Accept-Encoding with a non-zero q-value; "gzip;q=0" refuses it
+    for encoding in request.headers.get('Accept-Encoding', '').split(','):
+        name, *params = [part.strip() for part in encoding.split(';')]
+        if name.lower() != 'gzip':
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        return quality > 0
+    return False
+
+
 @api_view(['GET'])
 def export_data_to_json(request):
     """
-    Exports data from User, Profile, WaterEntry, FoodEntry,
-    Store, Goal, and WaterContainer models to a JSON serializable dictionary,
-    mapping fields individually.
+    Streams the user's data from User, Profile, WaterEntry, FoodEntry,
+    Store, Goal, and WaterContainer models, as one JSON document or, with
+    ?output=ndjson, one JSON record per line, or with ?output=compact in the
+    versioned column-oriented format with lossless timestamps.
+    Rows are read in chunks, so memory stays flat however long the history.
+    The stream is gzipped for clients sending Accept-Encoding: gzip, and
+    served as a .gz download with ?compress=1.
     """
-    data = {
-        'user': [],
-        'profile': [],
-        'water_entries': [],
-        'food_entries': [],
-        'stores': [],
-        'goals': [],
-        'water_containers': [],
+    output = request.query_params.get('output', 'json')
+    if output not in EXPORT_CONTENT_TYPES:
+        return Response({'success': False, 'error': f'Unknown output format: {output}'}, status=400)
+
+    stream = EXPORT_STREAMS[output](request.user)
+    if request.query_params.get('compress') in ('1', 'true', 'gzip'):
+        response = StreamingHttpResponse(gzip_stream(stream), content_type='application/gzip')
+        response['Content-Disposition'] = f'attachment; filename="{export_filename(output, True)}"'
+    elif accepts_gzip(request):
+        response = StreamingHttpResponse(gzip_stream(stream), content_type=EXPORT_CONTENT_TYPES[output])
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = StreamingHttpResponse(stream, content_type=EXPORT_CONTENT_TYPES[output])
+    response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def export_job_data(data_export):
+    response = {
+        'id': data_export.id,
+        'status': data_export.status,
+        'output': data_export.output,
+        'compress': data_export.compress,
+        'rows_written': data_export.rows_written,
+        'total_rows': data_export.total_rows,
+        'progress': round(data_export.rows_written / data_export.total_rows * 100) if data_export.total_rows else 0,
+        'created_at': data_export.created_at,
     }
+    if data_export.status == 'done':
+        response['download_url'] = f'/api/export-jobs/{data_export.id}/download/'
+        response['expires_at'] = data_export.updated_at + EXPORT_RETENTION
+    if data_export.status == 'failed':
+        response['error'] = data_export.error
+    return response
 
-    user = User.objects.get(id=request.user.id)
-
-    # Export User
-    user_data = {
-        'email': user.email,
-        'first_name': user.first_name,
-        'last_name': user.last_name,
-        'username': user.username,
-        'phone': user.phone,
-        'dob': user.dob.strftime('%A, %B %d, %Y') if user.dob else None,  # handle date
-        'created_at': user.created_at.strftime('%A, %B %d, %Y %I:%M %p'),
-    }
-    data['user'].append(user_data)
-
-    # Export Profile
-    if hasattr(user, 'user_profile'):  # Check if the user has a profile.
-        profile = user.user_profile
-        profile_data = {
-            'primary_goal': profile.primary_goal,
-            'current_diet': profile.current_diet,
-            'snacking': profile.snacking,
-            'beverages': profile.beverages,
-            'water_intake': profile.water_intake,
-            'dietary_restrictions': profile.dietary_restrictions,
-            'exercise': profile.exercise,
-            'usual_store': profile.usual_store,
-            'default_foods': profile.default_foods,
-            'default_water_containers': profile.default_water_containers,
-            'streak': profile.streak,
-            'created_at': profile.created_at.strftime('%A, %B %d, %Y %I:%M %p'),
-        }
-        data['profile'].append(profile_data)
-    else:
-        data['profile'].append(None)  # Append None if user doesn't have a profile
-
-    # Export Water Entries
-    for entry in user.water_entries.all():
-        entry_data = {
-            'amount': entry.amount,
-            'created_at': entry.created_at.strftime('%A, %B %d, %Y %I:%M %p'),
-        }
-        data['water_entries'].append(entry_data)
-
-    # Export Food Entries
-    for entry in user.food_entries.filter(is_default=False, is_quick_add=False).all():
-        entry_data = {
-            'food_name': entry.food_name,
-            'calories': entry.calories,
-            'purchased': entry.purchased,
-            'purchased_from': entry.purchased_from.name if entry.purchased_from else None,
-            'health_rating': entry.health_rating,
-            'meal_type': entry.meal_type,
-            'notes': entry.notes,
-            'protein': entry.protein,
-            'carbs': entry.carbs,
-            'fat': entry.fat,
-            'frequency': entry.frequency,
-            'created_at': entry.created_at.strftime('%A, %B %d, %Y %I:%M %p'),
-        }
-        data['food_entries'].append(entry_data)
-
-    # Export Stores
-    for store in user.stores.all():
-        store_data = {
-            'name': store.name,
-            'address': store.address,
-            'visits': store.visits,
-            'created_at': store.created_at.strftime('%A, %B %d, %Y %I:%M %p'),
-        }
-        data['stores'].append(store_data)
-
-    # Export Goals
-    if hasattr(user, 'goal'):
-        goal = user.goal
-        goal_data = {
-            'calorie_goal': goal.calorie_goal,
-            'water_goal': goal.water_goal,
-            'protein_goal': goal.protein_goal,
-            'carbs_goal': goal.carbs_goal,
-            'fat_goal': goal.fat_goal,
-            'created_at': goal.created_at.strftime('%A, %B %d, %Y %I:%M %p'),
-        }
-        data['goals'].append(goal_data)
+
+# POST starts an export in the background (?output= and ?compress= as for export-data/),
+# GET with an exportId returns its status and progress. Finished exports expire after EXPORT_RETENTION
+@api_view(['GET', 'POST'])
+def export_jobs(request, exportId=None):
+    if request.method == 'POST':
+        # form and multipart bodies are QueryDicts, whose items are lists of values
+        data = request.data.dict() if isinstance(request.data, QueryDict) else request.data
+        if not isinstance(data, dict):
+            return Response({'success': False, 'error': 'the request body must be a JSON object'}, status=400)
+        options = {**request.query_params.dict(), **data}
+        output = options.get('output', 'json')
+        compress = str(options.get('compress', '')).lower() in ('1', 'true', 'gzip')
+        if output not in EXPORT_STREAMS:
+            return Response({'success': False, 'error': f'Unknown output format: {output}'}, status=400)
+
+        data_export = DataExport.objects.create(user=request.user, output=output, compress=compress)
+        # written by the export_data job (manage.py run_jobs)
+        enqueue('export_data', {'export_id': data_export.id})
+        return Response(export_job_data(data_export), status=202)
+
+    data_export = DataExport.objects.filter(user=request.user, id=exportId).first()
+    if data_export is None:
+        return Response({'success': False, 'error': 'Export not found'}, status=404)
+    return Response(export_job_data(data_export))
+
+
+class FileRange:
+    # file-like object reading `length` bytes of `file` from its current position
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def ranged_file_response(request, path, filename, content_type):
+    """
+    FileResponse for a file on disk that honours a single "Range: bytes=..."
+    request header with a 206 Partial Content response, so large downloads
+    can be resumed.
+    """
+    size = os.path.getsize(path)
+    match = RANGE_PATTERN.match(request.headers.get('Range', ''))
+    if not match or not any(match.groups()):
+        response = FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type=content_type)
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    first, last = match.groups()
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
     else:
-        data['goals'].append(None)
+        # "bytes=-500" is the last 500 bytes
+        start, end = max(size - int(last), 0), size - 1
+    if start > end or start >= size:
+        return HttpResponse(status=416, headers={'Content-Range': f'bytes */{size}'})
+
+    file = open(path, 'rb')
+    file.seek(start)
+    response = FileResponse(FileRange(file, end - start + 1), as_attachment=True, filename=filename,
+                            content_type=content_type, status=206)
+    response['Content-Length'] = end - start + 1
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+# serves the file of a finished export, with Range support
+@api_view(['GET'])
+def download_export(request, exportId):
+    data_export = DataExport.objects.filter(user=request.user, id=exportId, status='done').first()
+    if data_export is None or not data_export.file or not os.path.exists(data_export.file.path):
+        return Response({'success': False, 'error': 'Export not found'}, status=404)
+
+    content_type = 'application/gzip' if data_export.compress else EXPORT_CONTENT_TYPES[data_export.output]
+    return ranged_file_response(request, data_export.file.path,
+                                export_filename(data_export.output, data_export.compress), content_type)
 
-    # Export Water Containers
-    for container in user.water_containers.filter(is_default=False).all():
-        container_data = {
-            'amount': container.amount,
-            'label': container.label,
-            'created_at': container.created_at.strftime('%A, %B %d, %Y %I:%M %p'),
-        }
-        data['water_containers'].append(container_data)
 
-    return Response(data)
+# content type of NDJSON exports, as written by export-data/?output=ndjson
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
 
 
+# imports an export sent as the JSON body, or as NDJSON, either as the request body or an uploaded .ndjson file.
+# Bodies sent with Content-Encoding: gzip and uploaded .gz files are decompressed on the fly.
+# NDJSON is read line by line, so large backups are never held in memory whole.
 @api_view(['POST'])
 def import_data_from_json(request):
-    json_data = request.data
-    user = request.user
-
-    # Delete existing data
-    WaterEntry.objects.filter(user=request.user).delete()
-    WaterEntry.objects.filter(user=request.user).delete()
-    FoodEntry.objects.filter(user=request.user, is_default=False).delete()
-    Store.objects.filter(user=request.user).delete()
-    Profile.objects.filter(user=request.user).delete()
-    Goal.objects.filter(user=request.user).delete()
-    WaterContainer.objects.filter(user=request.user, is_default=False).delete()
-
-    # Import Profiles
-    for profile_data in json_data.get('profile', []):
-        profile = Profile(user=user)
-        for key, value in profile_data.items():
-            if key == 'created_at':
-                try:
-                    profile.created_at = datetime.strptime(value, '%A, %B %d, %Y %I:%M %p')
-                except (ValueError, TypeError):
-                    print(f"Warning: Could not parse 'created_at' value: {value} for Profile.")
-            elif hasattr(profile, key) and key != 'id':
-                setattr(profile, key, value)
-        profile.save()
-
-    # Import Stores
-    for store_data in json_data.get('stores', []):
-        store = Store(user=user)
-        for key, value in store_data.items():
-            if key == 'created_at':
-                try:
-                    store.created_at = datetime.strptime(value, '%A, %B %d, %Y %I:%M %p')
-                except (ValueError, TypeError):
-                    print(f"Warning: Could not parse 'created_at' value: {value} for Store.")
-            elif hasattr(store, key) and key != 'id':
-                setattr(store, key, value)
-        store.save()
-
-    # Import Water Entries
-    for entry_data in json_data.get('water_entries', []):
-        water_entry = WaterEntry(user=user)
-        for key, value in entry_data.items():
-            if key == 'created_at':
-                try:
-                    water_entry.created_at = datetime.strptime(value, '%A, %B %d, %Y %I:%M %p')
-                except (ValueError, TypeError):
-                    print(f"Warning: Could not parse 'created_at' value: {value} for WaterEntry.")
-            elif hasattr(water_entry, key) and key != 'id':
-                setattr(water_entry, key, value)
-        water_entry.save()
-
-    # Import Food Entries
-    for entry_data in json_data.get('food_entries', []):
-        food_entry = FoodEntry(user=user)
-        purchased_from_name = entry_data.pop('purchased_from', None)
-        if purchased_from_name:
-            try:
-                store = Store.objects.get(user=user, name=purchased_from_name)
-                food_entry.purchased_from = store
-            except ObjectDoesNotExist:
-                print(f"Warning: Store with name '{purchased_from_name}' "
-                      f"not found for user, skipping purchased_from for FoodEntry.")
-            except Exception as e:
-                print(f"Error while finding store for FoodEntry: {e}")
-
-        for key, value in entry_data.items():
-            if key == 'created_at':
-                try:
-                    food_entry.created_at = datetime.strptime(value, '%A, %B %d, %Y %I:%M %p')
-                except (ValueError, TypeError):
-                    print(f"Warning: Could not parse 'created_at' value: {value} for FoodEntry.")
-            elif hasattr(food_entry, key) and key != 'id':
-                setattr(food_entry, key, value)
-        food_entry.save()
-
-    # Import Goals
-    for goal_data in json_data.get('goals', []):
-        goal = Goal(user=user)
-        for key, value in goal_data.items():
-            if key == 'created_at':
-                try:
-                    goal.created_at = datetime.strptime(value, '%A, %B %d, %Y %I:%M %p')
-                except (ValueError, TypeError):
-                    print(f"Warning: Could not parse 'created_at' value: {value} for Goal.")
-            elif hasattr(goal, key) and key != 'id':
-                setattr(goal, key, value)
-        goal.save()
-
-    # Import Water Containers
-    for container_data in json_data.get('water_containers', []):
-        water_container = WaterContainer(user=user)
-        for key, value in container_data.items():
-            if key == 'created_at':
-                try:
-                    water_container.created_at = datetime.strptime(value, '%A, %B %d, %Y %I:%M %p')
-                except (ValueError, TypeError):
-                    print(f"Warning: Could not parse 'created_at' value: {value} for WaterContainer.")
-            if hasattr(water_container, key) and key != 'id':
-                setattr(water_container, key, value)
-        water_container.save()
+    ndjson = request.content_type.startswith(NDJSON_CONTENT_TYPE)
+    gzipped = request.headers.get('Content-Encoding') == 'gzip'
+    source = request._request
+    if request.content_type.startswith('multipart/form-data'):
+        source = request.FILES.get('file')
+        if source is None:
+            return Response({'success': False, 'error': 'No file uploaded'}, status=400)
+        gzipped = source.name.endswith('.gz')
+        ndjson = source.name.removesuffix('.gz').endswith('.ndjson')
+
+    try:
+        if gzipped:
+            source = gzip.GzipFile(fileobj=source)
+        if ndjson:
+            import_ndjson(request.user, source)
+        elif source is request._request:
+            import_data(request.user, request.data)
+        else:
+            import_data(request.user, json.load(source))
+    except (AttributeError, KeyError, TypeError, ValueError, EOFError, OSError, zlib.error, ValidationError,
+            DatabaseError) as e:
+        # OSError includes gzip.BadGzipFile, zlib.error is raised for a corrupt compressed stream
+        # the import is rolled back, the user's existing data is kept
+        return Response({'success': False, 'error': f'Invalid import file: {e}'}, status=400)
 
     return Response({"success": True})
 
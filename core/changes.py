@@ -0,0 +1,78 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.db.models import Q, F
+
+from .models import User, FoodEntry, WaterEntry, WaterContainer, Goal, Store, Tombstone
+
+# rows returned per feed and request, clients keep asking while has_more is set
+CHANGES_PAGE_SIZE = 500
+
+# model and returned fields of every feed of /api/changes/
+CHANGE_FEEDS = {
+    'food_entries': (FoodEntry, ['id', 'entry_id', 'food_name', 'calories', 'purchased', 'purchased_from_id',
+                                 'health_rating', 'meal_type', 'notes', 'protein', 'carbs', 'fat', 'frequency',
+                                 'is_active', 'is_quick_add', 'is_default', 'created_at', 'updated_at']),
+    'water_entries': (WaterEntry, ['id', 'entry_id', 'amount', 'is_active', 'created_at', 'updated_at']),
+    'water_containers': (WaterContainer, ['id', 'container_id', 'amount', 'label', 'icon', 'is_active', 'is_default',
+                                          'created_at', 'updated_at']),
+    'goals': (Goal, ['id', 'calorie_goal', 'water_goal', 'protein_goal', 'carbs_goal', 'fat_goal', 'updated_at']),
+    'stores': (Store, ['id', 'name', 'visits', 'distance', 'location_status', 'updated_at']),
+    'deleted': (Tombstone, ['id', 'kind', 'object_id', 'updated_at']),
+}
+
+# extra fields computed in the query
+CHANGE_FEED_EXPRESSIONS = {
+    'stores': {'address': F('location__address')},
+}
+
+
+def record_tombstones(user: User, kind, object_ids):
+    Tombstone.objects.bulk_create([Tombstone(user=user, kind=kind, object_id=object_id) for object_id in object_ids])
+
+
+def encode_cursor(positions):
+    data = {feed: [updated_at.isoformat(), row_id] for feed, (updated_at, row_id) in positions.items()}
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode()
+
+
+def decode_cursor(cursor):
+    # {feed: (updated_at, id)} of the last row sent per feed; raises ValueError for a malformed cursor
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return {feed: (datetime.fromisoformat(updated_at), int(row_id))
+                for feed, (updated_at, row_id) in data.items() if feed in CHANGE_FEEDS}
+    except (binascii.Error, UnicodeError, TypeError, AttributeError, ValueError) as e:
+        raise ValueError(f'invalid cursor: {e}')
+
+
+def get_changes(user: User, cursor=None, page_size=None):
+    """
+    Returns the rows created, updated or soft-deleted since `cursor`, per
+    feed, plus tombstones of hard-deleted rows under 'deleted'. Each feed is
+    read in (updated_at, id) order from its (user, updated_at) index, and
+    the new cursor remembers the last row sent per feed.
+    """
+    page_size = page_size or CHANGES_PAGE_SIZE
+    positions = decode_cursor(cursor) if cursor else {}
+    changes = {}
+    has_more = False
+
+    for feed, (model, fields) in CHANGE_FEEDS.items():
+        rows = model.objects.filter(user=user)
+        if feed in positions:
+            updated_at, row_id = positions[feed]
+            rows = rows.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=row_id))
+        rows = list(rows.order_by('updated_at', 'id')
+                    .values(*fields, **CHANGE_FEED_EXPRESSIONS.get(feed, {}))[:page_size + 1])
+
+        if len(rows) > page_size:
+            has_more = True
+            rows = rows[:page_size]
+        if rows:
+            positions[feed] = (rows[-1]['updated_at'], rows[-1]['id'])
+        changes[feed] = rows
+
+    return {'changes': changes, 'cursor': encode_cursor(positions), 'has_more': has_more}
@@ -0,0 +1,271 @@
+import json
+import os
+import uuid
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import User, Profile, WaterEntry, FoodEntry, Store, Goal, WaterContainer, DataExport
+
+# rows fetched per database round trip, and records per chunk written to the response
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_TIME_FORMAT = '%A, %B %d, %Y %I:%M %p'
+
+# exports written by the export_data job are deleted, with their files, this long after they finish
+EXPORT_RETENTION = timedelta(days=7)
+
+# stores come before the food entries referencing them, so an export can be imported in a single pass
+EXPORT_SECTIONS = ['user', 'profile', 'stores', 'water_entries', 'food_entries', 'goals', 'water_containers']
+
+PROFILE_FIELDS = ['primary_goal', 'current_diet', 'snacking', 'beverages', 'water_intake', 'dietary_restrictions',
+                  'exercise', 'usual_store', 'default_foods', 'default_water_containers', 'streak']
+FOOD_ENTRY_FIELDS = ['food_name', 'calories', 'purchased', 'purchased_from__name', 'health_rating', 'meal_type',
+                     'notes', 'protein', 'carbs', 'fat', 'frequency']
+FOOD_RECORD_KEYS = [field.removesuffix('__name') for field in FOOD_ENTRY_FIELDS]
+GOAL_FIELDS = ['calorie_goal', 'water_goal', 'protein_goal', 'carbs_goal', 'fat_goal']
+
+# the compact export: {"format": COMPACT_FORMAT, "version": COMPACT_VERSION, "sections": {...}}
+# where each section is {"columns": [...], "rows": [[...], ...]} and timestamps are ISO-8601 in UTC
+COMPACT_FORMAT = 'wellness-tracker-export'
+COMPACT_VERSION = 2
+
+# (model, filters, columns) of every compact section, created_at always last
+COMPACT_SECTIONS = {
+    'profile': (Profile, {}, PROFILE_FIELDS + ['created_at']),
+    'stores': (Store, {}, ['name', 'visits', 'created_at']),
+    'water_entries': (WaterEntry, {}, ['entry_id', 'amount', 'is_active', 'created_at']),
+    # unlike the other formats this includes the user's own quick-add foods, which an import replaces as well
+    'food_entries': (FoodEntry, {'is_default': False},
+                     ['entry_id'] + FOOD_ENTRY_FIELDS + ['is_active', 'is_quick_add', 'created_at']),
+    'goals': (Goal, {}, GOAL_FIELDS + ['created_at']),
+    'water_containers': (WaterContainer, {'is_default': False},
+                         ['container_id', 'amount', 'label', 'icon', 'is_active', 'created_at']),
+}
+
+
+def export_time(value):
+    return value.strftime(EXPORT_TIME_FORMAT)
+
+
+def user_records(user: User):
+    yield {
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'username': user.username,
+        'phone': user.phone,
+        'dob': user.dob.strftime('%A, %B %d, %Y') if user.dob else None,
+        'created_at': export_time(user.created_at),
+    }
+
+
+def profile_records(user: User):
+    profile = Profile.objects.filter(user=user).values(*PROFILE_FIELDS, 'created_at').first()
+    if profile is not None:
+        profile['created_at'] = export_time(profile['created_at'])
+    # None when the user has no profile
+    yield profile
+
+
+def water_entry_records(user: User):
+    entries = WaterEntry.objects.filter(user=user).order_by('id').values_list('amount', 'created_at')
+    for amount, created_at in entries.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {'amount': amount, 'created_at': export_time(created_at)}
+
+
+def food_entry_records(user: User):
+    entries = (FoodEntry.objects.filter(user=user, is_default=False, is_quick_add=False).order_by('id')
+               .values_list(*FOOD_ENTRY_FIELDS, 'created_at'))
+    for *values, created_at in entries.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        record = dict(zip(FOOD_RECORD_KEYS, values))
+        record['created_at'] = export_time(created_at)
+        yield record
+
+
+def store_records(user: User):
+    stores = (Store.objects.filter(user=user).order_by('id')
+              .values_list('name', 'location__address', 'visits', 'created_at'))
+    for name, address, visits, created_at in stores.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {'name': name, 'address': address, 'visits': visits, 'created_at': export_time(created_at)}
+
+
+def goal_records(user: User):
+    goal = Goal.objects.filter(user=user).values(*GOAL_FIELDS, 'created_at').first()
+    if goal is not None:
+        goal['created_at'] = export_time(goal['created_at'])
+    yield goal
+
+
+def water_container_records(user: User):
+    containers = (WaterContainer.objects.filter(user=user, is_default=False).order_by('id')
+                  .values_list('amount', 'label', 'created_at'))
+    for amount, label, created_at in containers.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {'amount': amount, 'label': label, 'created_at': export_time(created_at)}
+
+
+SECTION_RECORDS = {
+    'user': user_records,
+    'profile': profile_records,
+    'water_entries': water_entry_records,
+    'food_entries': food_entry_records,
+    'stores': store_records,
+    'goals': goal_records,
+    'water_containers': water_container_records,
+}
+
+
+def chunked(records, size=EXPORT_CHUNK_SIZE):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_json(user: User, progress=None):
+    """
+    Yields the export as one JSON document, {"<section>": [records...], ...},
+    a chunk of records at a time. This is the layout import-data/ reads.
+    progress, if given, is called with the number of records in every chunk.
+    """
+    encoder = DjangoJSONEncoder()
+    yield '{'
+    for i, section in enumerate(EXPORT_SECTIONS):
+        yield f'{", " if i else ""}{json.dumps(section)}: ['
+        for j, chunk in enumerate(chunked(SECTION_RECORDS[section](user))):
+            yield (', ' if j else '') + ', '.join(encoder.encode(record) for record in chunk)
+            if progress:
+                progress(len(chunk))
+        yield ']'
+    yield '}\n'
+
+
+def stream_ndjson(user: User, progress=None):
+    """
+    Yields the export as newline-delimited JSON, one
+    {"section": ..., "record": {...}} object per line.
+    """
+    encoder = DjangoJSONEncoder()
+    for section in EXPORT_SECTIONS:
+        for chunk in chunked(record for record in SECTION_RECORDS[section](user) if record is not None):
+            yield ''.join(encoder.encode({'section': section, 'record': record}) + '\n' for record in chunk)
+            if progress:
+                progress(len(chunk))
+
+
+def compact_rows(user: User, section):
+    model, filters, columns = COMPACT_SECTIONS[section]
+    rows = model.objects.filter(user=user, **filters).order_by('id').values_list(*columns)
+    for *values, created_at in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        values.append(created_at.isoformat())
+        yield values
+
+
+def stream_compact(user: User, progress=None):
+    """
+    Yields the export in the versioned compact format: one column list and
+    an array of rows per section, with lossless ISO-8601 timestamps.
+    """
+    encoder = DjangoJSONEncoder()
+    yield f'{{"format": {json.dumps(COMPACT_FORMAT)}, "version": {COMPACT_VERSION}, "sections": {{'
+    for i, (section, (_, _, columns)) in enumerate(COMPACT_SECTIONS.items()):
+        columns = [column.removesuffix('__name') for column in columns]
+        yield f'{", " if i else ""}{json.dumps(section)}: {{"columns": {json.dumps(columns)}, "rows": ['
+        for j, chunk in enumerate(chunked(compact_rows(user, section))):
+            yield (', ' if j else '') + ', '.join(encoder.encode(row) for row in chunk)
+            if progress:
+                progress(len(chunk))
+        yield ']}'
+    yield '}}\n'
+
+
+def gzip_stream(chunks):
+    # gzip-compresses a stream of str chunks on the fly
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode())
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+# content type and stream of every export format
+EXPORT_CONTENT_TYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'compact': 'application/json',
+}
+
+EXPORT_STREAMS = {
+    'json': stream_json,
+    'ndjson': stream_ndjson,
+    'compact': stream_compact,
+}
+
+
+def export_filename(output, compress):
+    return f"export.{'ndjson' if output == 'ndjson' else 'json'}{'.gz' if compress else ''}"
+
+
+def count_export_rows(user: User):
+    # rows an export of the user writes, the user, profile and goal sections taken as one row each
+    return 3 + sum(model.objects.filter(user=user, **filters).count()
+                   for section, (model, filters, _) in COMPACT_SECTIONS.items() if section not in ('profile', 'goals'))
+
+
+def write_export(data_export: DataExport):
+    """
+    Writes the export described by a DataExport row to a file under
+    MEDIA_ROOT, a chunk at a time, recording the rows written so far.
+    """
+    name = f"exports/{uuid.uuid4().hex}-{export_filename(data_export.output, data_export.compress)}"
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    data_export.rows_written = 0
+    data_export.total_rows = count_export_rows(data_export.user)
+    data_export.save(update_fields=['rows_written', 'total_rows', 'updated_at'])
+
+    def progress(rows):
+        data_export.rows_written = min(data_export.rows_written + rows, data_export.total_rows)
+        DataExport.objects.filter(id=data_export.id).update(rows_written=data_export.rows_written,
+                                                            updated_at=timezone.now())
+
+    stream = EXPORT_STREAMS[data_export.output](data_export.user, progress)
+    chunks = gzip_stream(stream) if data_export.compress else (chunk.encode() for chunk in stream)
+    try:
+        with open(path, 'wb') as file:
+            for chunk in chunks:
+                file.write(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+    data_export.file.name = name
+    data_export.status = 'done'
+    # the count is an estimate, e.g. NDJSON leaves out a missing profile
+    data_export.rows_written = data_export.total_rows
+    data_export.save(update_fields=['file', 'status', 'rows_written', 'updated_at'])
+
+
+def delete_expired_exports():
+    """
+    Deletes the exports that finished more than EXPORT_RETENTION ago, along
+    with their files. Returns the number of exports deleted.
+    """
+    expired = DataExport.objects.filter(status__in=['done', 'failed'],
+                                        updated_at__lt=timezone.now() - EXPORT_RETENTION)
+    for name in expired.exclude(file='').values_list('file', flat=True):
+        if name:
+            default_storage.delete(name)
+    deleted, _ = expired.delete()
+    return deleted
@@ -0,0 +1,202 @@
+import calendar
+import json
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+
+from .changes import record_tombstones
+from .exports import EXPORT_SECTIONS, EXPORT_TIME_FORMAT, COMPACT_FORMAT, COMPACT_VERSION
+from .jobs import enqueue_many
+from .models import User, Profile, WaterEntry, FoodEntry, Store, Goal, WaterContainer
+from .rollups import rebuild_daily_rollups
+
+# rows per INSERT statement
+IMPORT_BATCH_SIZE = 1000
+
+# matches EXPORT_TIME_FORMAT, e.g. "Monday, March 03, 2025 07:15 PM"
+EXPORT_TIME_PATTERN = re.compile(r'^\w+, (\w+) (\d{1,2}), (\d{4}) (\d{1,2}):(\d{2}) ([AP]M)$')
+MONTHS = {name: number for number, name in enumerate(calendar.month_name) if name}
+
+# fields set by the importer itself, never taken from the file
+PROTECTED_FIELDS = {'id', 'user', 'created_at', 'updated_at', 'purchased_from', 'location'}
+
+
+def parse_export_time(value):
+    """
+    Parses an exported timestamp. Exports are written in UTC, so the result
+    is an aware UTC datetime. About three times faster than datetime.strptime.
+    """
+    match = EXPORT_TIME_PATTERN.match(value) if isinstance(value, str) else None
+    if match is None or match.group(1) not in MONTHS:
+        # e.g. a file written under another locale
+        return datetime.strptime(value, EXPORT_TIME_FORMAT).replace(tzinfo=dt_timezone.utc)
+    month, day, year, hour, minute, meridiem = match.groups()
+    hour = int(hour) % 12 + (12 if meridiem == 'PM' else 0)
+    return datetime(int(year), MONTHS[month], int(day), hour, int(minute), tzinfo=dt_timezone.utc)
+
+
+def import_fields(model):
+    return {field.name for field in model._meta.concrete_fields} - PROTECTED_FIELDS
+
+
+IMPORT_FIELDS = {model: import_fields(model)
+                 for model in [Profile, WaterEntry, FoodEntry, Store, Goal, WaterContainer]}
+
+
+def build(model, user, record, parse_time=parse_export_time, strict=False):
+    # strict rejects a record whose created_at cannot be parsed, otherwise it keeps the default of now
+    instance = model(user=user)
+    fields = IMPORT_FIELDS[model]
+    for key, value in record.items():
+        if key == 'created_at':
+            try:
+                instance.created_at = parse_time(value)
+            except (ValueError, TypeError):
+                if strict:
+                    raise ValueError(f'invalid created_at {value!r} in {model.__name__} record')
+                print(f"Warning: Could not parse 'created_at' value: {value} for {model.__name__}.")
+        elif key in fields:
+            setattr(instance, key, value)
+    return instance
+
+
+def delete_imported_data(user: User):
+    # clients syncing through the changes feed drop everything they have of the user
+    record_tombstones(user, 'all', [None])
+    WaterEntry.objects.filter(user=user).delete()
+    FoodEntry.objects.filter(user=user, is_default=False).delete()
+    Store.objects.filter(user=user).delete()
+    Profile.objects.filter(user=user).delete()
+    Goal.objects.filter(user=user).delete()
+    WaterContainer.objects.filter(user=user, is_default=False).delete()
+
+
+SECTION_MODELS = {
+    'profile': Profile,
+    'stores': Store,
+    'water_entries': WaterEntry,
+    'food_entries': FoodEntry,
+    'goals': Goal,
+    'water_containers': WaterContainer,
+}
+
+
+class RecordImporter:
+    """
+    Writes (section, record) pairs into the database as they arrive, a
+    batch of IMPORT_BATCH_SIZE rows per section at a time, so memory is
+    bounded by the batch size rather than the size of the import. Stores
+    have to come before the food entries referencing them.
+    """
+
+    def __init__(self, user: User, parse_time=parse_export_time, strict=False):
+        self.user = user
+        self.parse_time = parse_time
+        self.strict = strict
+        self.batches = {section: [] for section in SECTION_MODELS}
+        self.counts = {section: 0 for section in SECTION_MODELS}
+        # name -> id of the imported stores; the first store of a name wins
+        self.store_ids = {}
+
+    def add(self, section, record):
+        if section not in SECTION_MODELS or record is None:
+            # the user section is not imported, users without a profile or goal export a null
+            return
+        if not isinstance(record, dict):
+            raise ValueError(f'{section} records must be objects')
+
+        if section == 'food_entries':
+            self.flush('stores')
+        instance = build(SECTION_MODELS[section], self.user, record, self.parse_time, self.strict)
+        if section == 'stores':
+            # exported addresses are not trusted, the store is linked to the shared catalog by a locate_store job
+            instance.location_status = 'pending'
+        elif section == 'food_entries' and record.get('purchased_from'):
+            instance.purchased_from_id = self.store_ids.get(record['purchased_from'])
+            if instance.purchased_from_id is None:
+                print(f"Warning: Store with name '{record['purchased_from']}' "
+                      f"not found for user, skipping purchased_from for FoodEntry.")
+
+        batch = self.batches[section]
+        batch.append(instance)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            self.flush(section)
+
+    def flush(self, section):
+        batch = self.batches[section]
+        if not batch:
+            return
+        SECTION_MODELS[section].objects.bulk_create(batch, batch_size=IMPORT_BATCH_SIZE)
+        self.counts[section] += len(batch)
+        self.batches[section] = []
+
+        if section == 'stores':
+            stored = Store.objects.filter(user=self.user, name__in={store.name for store in batch}).order_by('id')
+            for store_id, name in stored.values_list('id', 'name'):
+                self.store_ids.setdefault(name, store_id)
+
+    def finish(self):
+        for section in SECTION_MODELS:
+            self.flush(section)
+        store_ids = Store.objects.filter(user=self.user).values_list('id', flat=True)
+        enqueue_many('locate_store', [{'store_id': store_id} for store_id in store_ids])
+        rebuild_daily_rollups(self.user)
+        return self.counts
+
+
+def import_records(user: User, records, parse_time=parse_export_time, strict=False):
+    """
+    Replaces the user's data with (section, record) pairs of an export.
+    Everything runs in one transaction, so a bad file leaves the existing
+    data untouched. Returns the row count per section.
+    """
+    with transaction.atomic():
+        delete_imported_data(user)
+        importer = RecordImporter(user, parse_time, strict)
+        for section, record in records:
+            importer.add(section, record)
+        return importer.finish()
+
+
+def compact_records(data):
+    # (section, record) pairs of a compact export, see exports.stream_compact
+    if data.get('version') != COMPACT_VERSION:
+        raise ValueError(f"unsupported export version: {data.get('version')}")
+    sections = data.get('sections') or {}
+    for section in EXPORT_SECTIONS:
+        if section in sections:
+            columns = sections[section]['columns']
+            for row in sections[section]['rows']:
+                yield section, dict(zip(columns, row))
+
+
+def import_data(user: User, data):
+    # imports an export parsed into a dict, either the compact format or the one of exports.stream_json
+    if not isinstance(data, dict):
+        raise ValueError('an export must be a JSON object')
+    if data.get('format') == COMPACT_FORMAT:
+        # the versioned format is written by this app, so a bad timestamp means a broken file
+        return import_records(user, compact_records(data), datetime.fromisoformat, strict=True)
+    return import_records(user, ((section, record) for section in EXPORT_SECTIONS
+                                 for record in data.get(section) or []))
+
+
+def ndjson_records(lines):
+    """
+    Parses an NDJSON export, see exports.stream_ndjson, one line at a time
+    into (section, record) pairs.
+    """
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            yield item['section'], item['record']
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError(f'line {number} is not an export record: {e}')
+
+
+def import_ndjson(user: User, lines):
+    # imports an NDJSON export from any iterable of lines, e.g. an uploaded file
+    return import_records(user, ndjson_records(lines))
@@ -0,0 +1,133 @@
+import traceback
+from datetime import timedelta
+
+from django.db.models import F
+from django.utils import timezone
+
+from .api.location import Location
+from .exports import write_export
+from .models import Job, Store, DataExport
+from .stores import assign_store_locations
+
+# seconds before the first retry, doubled after every failed attempt
+RETRY_BACKOFF = 30
+
+# a job still running after this long is taken to have lost its worker and is run again
+JOB_LEASE_TIMEOUT = timedelta(hours=1)
+
+# finished jobs are deleted after this long
+DONE_JOB_RETENTION = timedelta(days=7)
+
+
+def enqueue(kind, payload, run_after=None):
+    return Job.objects.create(kind=kind, payload=payload, run_after=run_after or timezone.now())
+
+
+def enqueue_many(kind, payloads, run_after=None):
+    run_after = run_after or timezone.now()
+    return Job.objects.bulk_create([Job(kind=kind, payload=payload, run_after=run_after) for payload in payloads],
+                                   batch_size=1000)
+
+
+def locate_store(payload, final_attempt):
+    store = Store.objects.select_related('user').filter(id=payload['store_id']).first()
+    if store is None:
+        return
+
+    try:
+        address = Location.get_nearest_locations(store.user.full_address, [store.name], raise_errors=True)[store.name]
+    except Exception:
+        if final_attempt:
+            store.location_status = 'failed'
+            store.save(update_fields=['location_status', 'updated_at'])
+        raise
+
+    assign_store_locations([store], {store.name: address})
+    store.location_status = 'located'
+    store.save(update_fields=['location', 'distance', 'location_status', 'updated_at'])
+
+
+def export_data(payload, final_attempt):
+    data_export = DataExport.objects.select_related('user').filter(id=payload['export_id']).first()
+    if data_export is None:
+        return
+
+    data_export.status = 'running'
+    data_export.save(update_fields=['status', 'updated_at'])
+    try:
+        write_export(data_export)
+    except Exception as e:
+        data_export.status = 'failed' if final_attempt else 'pending'
+        data_export.error = str(e)
+        data_export.save(update_fields=['status', 'error', 'updated_at'])
+        raise
+
+
+JOB_HANDLERS = {
+    'locate_store': locate_store,
+    'export_data': export_data,
+}
+
+
+def reclaim_stale_jobs():
+    """
+    Puts jobs back to pending whose worker died mid-job, i.e. that have been
+    running for longer than JOB_LEASE_TIMEOUT. The lost run counts as an
+    attempt, so a job that keeps killing its worker still ends up failed.
+    Returns the number of jobs reclaimed.
+    """
+    now = timezone.now()
+    return (Job.objects.filter(status='running', updated_at__lt=now - JOB_LEASE_TIMEOUT)
+            .update(status='pending', attempts=F('attempts') + 1, run_after=now, updated_at=now))
+
+
+def prune_jobs():
+    # deletes jobs finished more than DONE_JOB_RETENTION ago and returns how many
+    deleted, _ = Job.objects.filter(status='done', updated_at__lt=timezone.now() - DONE_JOB_RETENTION).delete()
+    return deleted
+
+
+def claim_next_job():
+    """
+    Marks the oldest due pending job as running and returns it, or None.
+    The conditional update makes the claim safe with several workers.
+    """
+    while True:
+        job = (Job.objects.filter(status='pending', run_after__lte=timezone.now())
+               .order_by('run_after', 'id').first())
+        if job is None:
+            return None
+        if Job.objects.filter(id=job.id, status='pending').update(status='running', updated_at=timezone.now()):
+            job.status = 'running'
+            return job
+
+
+def run_job(job):
+    job.attempts += 1
+    final_attempt = job.attempts >= job.max_attempts
+    try:
+        JOB_HANDLERS[job.kind](job.payload, final_attempt)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if final_attempt:
+            job.status = 'failed'
+        else:
+            job.status = 'pending'
+            job.run_after = timezone.now() + timedelta(seconds=RETRY_BACKOFF * 2 ** (job.attempts - 1))
+    else:
+        job.status = 'done'
+    job.save()
+    return job
+
+
+def run_pending_jobs(limit=None):
+    # runs due jobs until none are left (or `limit` have run) and returns how many ran
+    reclaim_stale_jobs()
+    count = 0
+    while limit is None or count < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from core.api.location import Location
+from core.models import Store, User
+from core.stores import assign_store_locations
+
+
+class Command(BaseCommand):
+    help = 'Links located stores that have no coordinates yet to the shared store location catalog'
+
+    def handle(self, *args, **options):
+        total = 0
+        for user in User.objects.filter(stores__location__isnull=True).distinct().iterator():
+            stores = list(Store.objects.filter(user=user, location__isnull=True).exclude(location_status='pending'))
+            # served from the geocode cache for stores that were looked up before
+            addresses = Location.get_nearest_locations(user.full_address, sorted({store.name for store in stores}))
+            assign_store_locations(stores, addresses)
+            Store.objects.bulk_update(stores, ['location', 'distance', 'updated_at'])
+
+            located = sum(store.location is not None for store in stores)
+            total += located
+            self.stdout.write(f'{user.email}: {located} of {len(stores)} stores linked')
+
+        self.stdout.write(self.style.SUCCESS(f'Linked {total} stores to the store location catalog'))
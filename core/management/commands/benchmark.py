@@ -0,0 +1,189 @@
+import random
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from geopy.distance import geodesic
+
+from core.api.distance import nearest_candidate
+from core.api.views import yearly_water_chart_data
+from core.exports import export_time
+from core.imports import import_data
+from core.models import User, WaterEntry, FoodEntry, Store
+from core.rollups import rebuild_daily_rollups
+
+
+class QueryCounter:
+    # execute wrapper counting queries, unlike the debug query log it has no upper bound
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(function, repeat):
+    # returns (queries per call, best wall time in ms) of the given callable
+    timings = []
+    queries = 0
+    for _ in range(repeat):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            function()
+            timings.append((time.perf_counter() - start) * 1000)
+        queries = counter.count
+    return queries, min(timings)
+
+
+def create_benchmark_user():
+    return User.objects.create(email=f'benchmark-{uuid.uuid4()}@example.com', username='benchmark')
+
+
+def create_water_year(user, entries_per_day, today):
+    entries = []
+    for i in range(365):
+        day = datetime.combine(today - timedelta(days=i), datetime.min.time())
+        for _ in range(entries_per_day):
+            created_at = timezone.make_aware(day + timedelta(seconds=random.randint(0, 86399)))
+            entries.append(WaterEntry(user=user, amount=random.choice([250, 500, 750]),
+                                      created_at=created_at, entry_id=str(uuid.uuid4())))
+    WaterEntry.objects.bulk_create(entries, batch_size=1000)
+    return len(entries)
+
+
+def legacy_water_entries_from_month(user, month, year):
+    return WaterEntry.objects.filter(user=user, created_at__month=month, created_at__year=year).order_by('created_at')
+
+
+def legacy_yearly_water_chart(user, today):
+    # the previous implementation: one query per month, summed in Python
+    total = 0
+    for i in range(11, -1, -1):
+        year = today.year - (today.month - 1 - i < 0)
+        month = (today.month - 1 - i) % 12 + 1
+        total += sum([log.amount for log in legacy_water_entries_from_month(user, month, year)])
+    return total
+
+
+def create_import_file(entries, stores=20):
+    # an export-format dict with `entries` water and food entries, half of each
+    now = timezone.now()
+    store_names = [f'Store {i}' for i in range(stores)]
+
+    def created_at():
+        return export_time(now - timedelta(minutes=random.randint(0, 60 * 24 * 365 * 3)))
+
+    return {
+        'user': [],
+        'profile': [None],
+        'stores': [{'name': name, 'address': None, 'visits': 1, 'created_at': created_at()} for name in store_names],
+        'water_entries': [{'amount': random.choice([250, 500, 750]), 'created_at': created_at()}
+                          for _ in range(entries // 2)],
+        'food_entries': [{'food_name': f'Food {random.randint(0, 99)}', 'calories': random.randint(50, 900),
+                          'purchased': True, 'purchased_from': random.choice(store_names), 'health_rating': '2',
+                          'protein': 10, 'carbs': 20, 'fat': 5, 'frequency': 1, 'created_at': created_at()}
+                         for _ in range(entries - entries // 2)],
+        'goals': [None],
+        'water_containers': [],
+    }
+
+
+def legacy_import(user, data):
+    # the previous implementation: a save per row, a store lookup per food entry and strptime per timestamp
+    for section, model in [('stores', Store), ('water_entries', WaterEntry), ('food_entries', FoodEntry)]:
+        for record in data[section]:
+            instance = model(user=user)
+            for key, value in record.items():
+                if key == 'created_at':
+                    instance.created_at = timezone.make_aware(datetime.strptime(value, '%A, %B %d, %Y %I:%M %p'),
+                                                              dt_timezone.utc)
+                elif key == 'purchased_from':
+                    instance.purchased_from = Store.objects.get(user=user, name=value)
+                elif hasattr(instance, key):
+                    setattr(instance, key, value)
+            instance.save()
+    rebuild_daily_rollups(user)
+
+
+def legacy_nearest_candidate(origin, lats, lons):
+    # the previous implementation: one geodesic call per candidate
+    nearest, min_distance = None, float('inf')
+    for i, coords in enumerate(zip(lats, lons)):
+        distance = geodesic(origin, coords).km
+        if distance < min_distance:
+            nearest, min_distance = i, distance
+    return nearest, min_distance
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks query count and latency of the dashboard hot paths on throwaway data'
+
+    benchmarks = ['yearly_water_chart', 'nearest_candidate', 'import_data']
+
+    def add_arguments(self, parser):
+        parser.add_argument('benchmark', choices=self.benchmarks)
+        parser.add_argument('--entries-per-day', type=int, default=12)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--entries', type=int, default=100000)
+        parser.add_argument('--skip-legacy', action='store_true')
+
+    def handle(self, *args, **options):
+        # all benchmark data is rolled back when the benchmark finishes
+        with transaction.atomic():
+            getattr(self, f"benchmark_{options['benchmark']}")(options)
+            transaction.set_rollback(True)
+
+    def report(self, label, queries, milliseconds):
+        self.stdout.write(f'{label:<12} {queries:>4} queries  {milliseconds:>9.2f} ms')
+
+    def report_timing(self, label, milliseconds):
+        self.stdout.write(f'{label:<24} {milliseconds:>9.3f} ms')
+
+    def benchmark_yearly_water_chart(self, options):
+        today = date.today()
+        user = create_benchmark_user()
+        count = create_water_year(user, options['entries_per_day'], today)
+        rebuild_daily_rollups(user)
+        self.stdout.write(f'yearly_water_chart: {count} water entries over 365 days')
+
+        self.report('legacy', *measure(lambda: legacy_yearly_water_chart(user, today), options['repeat']))
+        self.report('current', *measure(lambda: yearly_water_chart_data(user, today), options['repeat']))
+
+        if legacy_yearly_water_chart(user, today) != yearly_water_chart_data(user, today)['total_this_year']:
+            self.stderr.write('yearly totals differ between the legacy and current implementation')
+
+    def benchmark_nearest_candidate(self, options):
+        origin = (35.3074, -80.7352)
+        for count in [10, 100, 1000]:
+            lats = [origin[0] + random.uniform(-0.5, 0.5) for _ in range(count)]
+            lons = [origin[1] + random.uniform(-0.5, 0.5) for _ in range(count)]
+            self.stdout.write(f'nearest_candidate: {count} candidates')
+
+            _, legacy = measure(lambda: legacy_nearest_candidate(origin, lats, lons), options['repeat'])
+            _, haversine = measure(lambda: nearest_candidate(origin, lats, lons, refine_top_k=0), options['repeat'])
+            _, refined = measure(lambda: nearest_candidate(origin, lats, lons), options['repeat'])
+            self.report_timing('legacy geodesic loop', legacy)
+            self.report_timing('haversine', haversine)
+            self.report_timing('haversine + top-3 refine', refined)
+
+            if legacy_nearest_candidate(origin, lats, lons)[0] != nearest_candidate(origin, lats, lons)[0]:
+                self.stderr.write('nearest candidate differs between the legacy and current implementation')
+
+    def benchmark_import_data(self, options):
+        data = create_import_file(options['entries'])
+        self.stdout.write(f"import_data: {options['entries']} entries")
+
+        if not options['skip_legacy']:
+            user = create_benchmark_user()
+            self.report('legacy', *measure(lambda: legacy_import(user, data), 1))
+        user = create_benchmark_user()
+        self.report('current', *measure(lambda: import_data(user, data), 1))
+
+        if WaterEntry.objects.filter(user=user).count() + FoodEntry.objects.filter(user=user).count() != \
+                options['entries']:
+            self.stderr.write('imported entry count differs from the import file')
@@ -0,0 +1,32 @@
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.api.poi_index import PoiIndex
+
+
+class Command(BaseCommand):
+    help = 'Builds the offline store index from an OpenStreetMap POI extract (.csv or .geojson)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('extract', type=Path)
+        parser.add_argument('--output', type=Path, default=settings.POI_INDEX_PATH)
+
+    def handle(self, *args, **options):
+        extract = options['extract']
+        if not extract.exists():
+            raise CommandError(f'{extract} does not exist')
+
+        start = time.time()
+        if extract.suffix.lower() == '.csv':
+            index = PoiIndex.from_csv(extract)
+        elif extract.suffix.lower() in ('.geojson', '.json'):
+            index = PoiIndex.from_geojson(extract)
+        else:
+            raise CommandError('The extract must be a .csv or .geojson file')
+
+        index.save(options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {len(index)} POIs into {options['output']} in {time.time() - start:.2f} seconds"))
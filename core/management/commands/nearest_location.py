@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.api.location import Location, cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Looks up the nearest store location to an address and prints the geocode cache counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('address', nargs='?', default='9201 University City Blvd, Charlotte, NC 28223')
+        parser.add_argument('store', nargs='?', default='Walmart')
+        parser.add_argument('--repeat', type=int, default=1)
+
+    def handle(self, *args, **options):
+        for _ in range(options['repeat']):
+            start = time.time()
+            nearest_address = Location.get_nearest_location(options['address'], options['store'])
+            self.stdout.write(f"Total process took {time.time() - start} seconds")
+
+        self.stdout.write(f"The {options['store']} location to {options['address']} is likely:\n"
+                          f"{nearest_address['full_address']}\n")
+        self.stdout.write(f"Geocode cache: {cache_stats.as_dict()}")
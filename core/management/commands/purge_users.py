@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import User
+from core.purge import purge_user, PURGE_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Deletes users and all of their data in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('emails', nargs='+', help='Emails of the users to purge')
+        parser.add_argument('--batch-size', type=int, default=PURGE_BATCH_SIZE, help='Rows deleted per transaction')
+
+    def handle(self, *args, **options):
+        users = list(User.objects.filter(email__in=[email.lower() for email in options['emails']]))
+        if not users:
+            raise CommandError('No users found for the given emails')
+
+        def progress(model, deleted):
+            self.stdout.write(f'  {model._meta.verbose_name_plural}: {deleted} deleted')
+
+        for i, user in enumerate(users, 1):
+            self.stdout.write(f'[{i}/{len(users)}] Purging {user.email}')
+            counts = purge_user(user, options['batch_size'], progress)
+            self.stdout.write(f'[{i}/{len(users)}] Purged {user.email}: {sum(counts.values())} rows')
+
+        self.stdout.write(self.style.SUCCESS(f'Purged {len(users)} users'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import User
+from core.rollups import rebuild_daily_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the per-user daily water and nutrition rollups from the raw entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('emails', nargs='*', help='Only rebuild the rollups of these users')
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['emails']:
+            users = users.filter(email__in=[email.lower() for email in options['emails']])
+            if not users.exists():
+                raise CommandError('No users found for the given emails')
+
+        for user in users.iterator():
+            days = rebuild_daily_rollups(user)
+            self.stdout.write(f'{user.email}: rebuilt {days} daily rollups')
+
+        self.stdout.write(self.style.SUCCESS('Daily rollups rebuilt successfully'))
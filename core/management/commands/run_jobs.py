@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.exports import delete_expired_exports
+from core.jobs import run_pending_jobs, prune_jobs
+
+# seconds between two prunes of finished jobs and expired exports
+PRUNE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs such as store geocoding'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the jobs that are due and exit')
+        parser.add_argument('--sleep', type=float, default=2, help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        pruned_at = None
+        while True:
+            if pruned_at is None or time.monotonic() - pruned_at >= PRUNE_INTERVAL:
+                pruned = prune_jobs()
+                if pruned:
+                    self.stdout.write(f'Pruned {pruned} finished jobs')
+                expired = delete_expired_exports()
+                if expired:
+                    self.stdout.write(f'Deleted {expired} expired exports')
+                pruned_at = time.monotonic()
+
+            count = run_pending_jobs()
+            if count:
+                self.stdout.write(f'Ran {count} jobs')
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
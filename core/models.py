@@ -3,6 +3,7 @@ from uuid import uuid4
 
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils import timezone
 
 
@@ -66,6 +67,14 @@ class WaterEntry(models.Model):
     class Meta:
         verbose_name = 'Water Entry'
         verbose_name_plural = 'Water Entries'
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='waterentry_user_created_idx'),
+            models.Index(fields=['user', 'entry_id'], name='waterentry_user_entry_idx'),
+            models.Index(fields=['user', 'created_at'], condition=models.Q(is_active=True),
+                         name='waterentry_user_active_idx'),
+            # changes feed
+            models.Index(fields=['user', 'updated_at'], name='waterentry_user_updated_idx'),
+        ]
 
 
 class FoodEntry(models.Model):
@@ -94,15 +103,52 @@ class FoodEntry(models.Model):
     class Meta:
         verbose_name = 'Food Entry'
         verbose_name_plural = 'Food Entries'
+        indexes = [
+            models.Index(fields=['user', 'food_name'], name='foodentry_user_food_name_idx'),
+            models.Index('user', Lower('food_name'), name='foodentry_user_lower_name_idx'),
+            models.Index(fields=['user', 'created_at'], name='foodentry_user_created_idx'),
+            models.Index(fields=['user', 'entry_id'], name='foodentry_user_entry_idx'),
+            models.Index(fields=['user', 'created_at'], condition=models.Q(is_active=True, is_quick_add=False),
+                         name='foodentry_user_logged_idx'),
+            # changes feed
+            models.Index(fields=['user', 'updated_at'], name='foodentry_user_updated_idx'),
+        ]
+
+
+class StoreLocation(models.Model):
+    # shared catalog of geocoded store branches, one row per place however many users visit it
+    name = models.CharField(max_length=100, blank=True, null=True)
+    address = models.CharField(max_length=100, blank=True, null=True)
+    full_address = models.CharField(max_length=500)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Store Location'
+        verbose_name_plural = 'Store Locations'
+        constraints = [
+            models.UniqueConstraint(fields=['latitude', 'longitude', 'full_address'], name='unique_store_location'),
+        ]
+        indexes = [
+            # bounding-box prefilter of /api/stores/nearby/
+            models.Index(fields=['latitude', 'longitude'], name='store_location_lat_lon_idx'),
+        ]
 
 
 class Store(models.Model):
+    # a user's link to the branch they shop at, with their own visit count and distance to it
     name = models.CharField(max_length=100, blank=True, null=True)
-    address = models.CharField(max_length=100, blank=True, null=True)
     visits = models.IntegerField(blank=True, null=True)
     distance = models.FloatField(blank=True, null=True)
+    # 'pending' until a background job has looked up location and distance
+    location_status = models.CharField(max_length=20, default='located')
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True, related_name='stores')
+    location = models.ForeignKey(StoreLocation, on_delete=models.SET_NULL, blank=True, null=True,
+                                 related_name='stores')
 
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
@@ -110,6 +156,10 @@ class Store(models.Model):
     class Meta:
         verbose_name = 'Store'
         verbose_name_plural = 'Stores'
+        indexes = [
+            # changes feed
+            models.Index(fields=['user', 'updated_at'], name='store_user_updated_idx'),
+        ]
 
 
 class Goal(models.Model):
@@ -143,6 +193,10 @@ class WaterContainer(models.Model):
     class Meta:
         verbose_name = 'Water Container'
         verbose_name_plural = 'Water Containers'
+        indexes = [
+            # changes feed
+            models.Index(fields=['user', 'updated_at'], name='container_user_updated_idx'),
+        ]
 
 
 class LocationAddress(models.Model):
@@ -157,4 +211,99 @@ class LocationAddress(models.Model):
 
     class Meta:
         verbose_name = 'location address'
-        verbose_name_plural = 'location addresses'
\ No newline at end of file
+        verbose_name_plural = 'location addresses'
+
+
+class DailyRollup(models.Model):
+    day = models.DateField()
+    water_total = models.IntegerField(default=0)
+    water_entry_count = models.IntegerField(default=0)
+    calories = models.IntegerField(default=0)
+    protein = models.IntegerField(default=0)
+    carbs = models.IntegerField(default=0)
+    fat = models.IntegerField(default=0)
+    healthy_count = models.IntegerField(default=0)
+    food_entry_count = models.IntegerField(default=0)
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True, related_name='daily_rollups')
+
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Daily Rollup'
+        verbose_name_plural = 'Daily Rollups'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='unique_daily_rollup_per_user'),
+        ]
+
+
+class GeocodeCache(models.Model):
+    query = models.CharField(max_length=500, unique=True)
+    response = models.JSONField(default=list)
+
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Geocode Cache'
+        verbose_name_plural = 'Geocode Cache'
+
+
+class Job(models.Model):
+    kind = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, default='pending')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Job'
+        verbose_name_plural = 'Jobs'
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+
+
+class Tombstone(models.Model):
+    # a hard-deleted row for the changes feed; kind 'all' marks that all of the user's data was replaced
+    kind = models.CharField(max_length=50)
+    object_id = models.BigIntegerField(blank=True, null=True)
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True, related_name='tombstones')
+
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Tombstone'
+        verbose_name_plural = 'Tombstones'
+        indexes = [
+            models.Index(fields=['user', 'updated_at'], name='tombstone_user_updated_idx'),
+        ]
+
+
+class DataExport(models.Model):
+    # an export written to a file by the export_data job, see core.exports.write_export
+    output = models.CharField(max_length=20, default='json')
+    compress = models.BooleanField(default=False)
+    # 'pending', 'running', 'done' or 'failed'
+    status = models.CharField(max_length=20, default='pending')
+    rows_written = models.IntegerField(default=0)
+    total_rows = models.IntegerField(default=0)
+    file = models.FileField(upload_to='exports/', blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True, related_name='data_exports')
+
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Data Export'
+        verbose_name_plural = 'Data Exports'
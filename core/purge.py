@@ -0,0 +1,57 @@
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .models import (User, Profile, WaterEntry, FoodEntry, Store, Goal, WaterContainer, LocationAddress,
+                     DailyRollup, Tombstone, DataExport)
+
+# rows deleted per transaction, the SQLite write lock is released in between
+PURGE_BATCH_SIZE = 500
+
+# tables holding a user's rows, children before the rows they reference (food entries before stores)
+PURGE_MODELS = [FoodEntry, WaterEntry, DailyRollup, Tombstone, DataExport, WaterContainer, Store, Goal, Profile,
+                LocationAddress]
+
+
+def delete_export_files(ids):
+    for name in DataExport.objects.filter(id__in=ids).exclude(file='').values_list('file', flat=True):
+        if name:
+            default_storage.delete(name)
+
+
+def delete_in_batches(model, user: User, batch_size, progress=None):
+    """
+    Deletes the user's rows of one table in primary-key order, one
+    transaction per batch of ids. Returns the number of rows deleted.
+    """
+    deleted = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            ids = list(model.objects.filter(user=user, pk__gt=last_id).order_by('pk')
+                       .values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            if model is DataExport:
+                delete_export_files(ids)
+            model.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+        last_id = ids[-1]
+        if progress:
+            progress(model, deleted)
+    return deleted
+
+
+def purge_user(user: User, batch_size=None, progress=None):
+    """
+    Deletes a user and all of their data. Each table is emptied in bounded
+    batches first, so the final user.delete() has nothing left to cascade
+    to and no transaction holds the write lock for long. progress, if given,
+    is called with the model and the rows deleted so far after every batch.
+    Returns the number of rows deleted per model name.
+    """
+    batch_size = batch_size or PURGE_BATCH_SIZE
+    counts = {}
+    for model in PURGE_MODELS:
+        counts[model.__name__] = delete_in_batches(model, user, batch_size, progress)
+    user.delete()
+    return counts
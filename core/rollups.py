@@ -0,0 +1,106 @@
+from django.db import transaction
+from django.db.models import Sum, Count, Q
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import User, WaterEntry, FoodEntry, DailyRollup
+
+
+def entry_day(entry):
+    # local calendar day an entry is rolled up into
+    created_at = entry.created_at
+    if timezone.is_naive(created_at):
+        return created_at.date()
+    return timezone.localdate(created_at)
+
+
+def refresh_daily_rollup(user: User, day):
+    """
+    Recomputes the rollup row of a single day from that day's raw entries.
+    Called after an entry on that day is created, updated or deleted, inside
+    a transaction. The row is locked before the entries are summed, so two
+    concurrent refreshes of a day on a read-committed backend cannot write
+    back stale totals; on SQLite the write lock already serialises them.
+    """
+    # imported here as core.api.views imports this module
+    from core.api.views import get_day_range
+
+    # there is always a row to lock, even for the first entry of the day
+    DailyRollup.objects.get_or_create(user=user, day=day)
+    rollup = DailyRollup.objects.select_for_update().get(user=user, day=day)
+
+    start, end = get_day_range(day)
+    water = WaterEntry.objects.filter(user=user, created_at__gte=start, created_at__lt=end,
+                                      is_active=True).aggregate(
+        water_total=Coalesce(Sum('amount'), 0),
+        water_entry_count=Count('id'),
+    )
+    food = FoodEntry.objects.filter(user=user, created_at__gte=start, created_at__lt=end,
+                                    is_active=True, is_quick_add=False).aggregate(
+        calories=Coalesce(Sum('calories'), 0),
+        protein=Coalesce(Sum('protein'), 0),
+        carbs=Coalesce(Sum('carbs'), 0),
+        fat=Coalesce(Sum('fat'), 0),
+        healthy_count=Count('id', filter=Q(health_rating='3')),
+        food_entry_count=Count('id'),
+    )
+
+    if not water['water_entry_count'] and not food['food_entry_count']:
+        rollup.delete()
+        return None
+
+    for field, value in {**water, **food}.items():
+        setattr(rollup, field, value)
+    rollup.save()
+    return rollup
+
+
+def refresh_daily_rollups(user: User, *days):
+    with transaction.atomic():
+        for day in set(days):
+            refresh_daily_rollup(user, day)
+
+
+def rebuild_daily_rollups(user: User):
+    """
+    Rebuilds every rollup row of a user from scratch with one grouped
+    query per entry table. Used after imports and bulk inserts.
+    """
+    rollups = {}
+
+    water_days = (WaterEntry.objects.filter(user=user, is_active=True)
+                  .annotate(day=TruncDate('created_at'))
+                  .values('day')
+                  .annotate(water_total=Coalesce(Sum('amount'), 0), water_entry_count=Count('id')))
+    for row in water_days:
+        rollups[row['day']] = DailyRollup(user=user, day=row['day'], water_total=row['water_total'],
+                                          water_entry_count=row['water_entry_count'])
+
+    food_days = (FoodEntry.objects.filter(user=user, is_active=True, is_quick_add=False)
+                 .annotate(day=TruncDate('created_at'))
+                 .values('day')
+                 .annotate(calories=Coalesce(Sum('calories'), 0),
+                           protein=Coalesce(Sum('protein'), 0),
+                           carbs=Coalesce(Sum('carbs'), 0),
+                           fat=Coalesce(Sum('fat'), 0),
+                           healthy_count=Count('id', filter=Q(health_rating='3')),
+                           food_entry_count=Count('id')))
+    for row in food_days:
+        rollup = rollups.setdefault(row['day'], DailyRollup(user=user, day=row['day']))
+        rollup.calories = row['calories']
+        rollup.protein = row['protein']
+        rollup.carbs = row['carbs']
+        rollup.fat = row['fat']
+        rollup.healthy_count = row['healthy_count']
+        rollup.food_entry_count = row['food_entry_count']
+
+    with transaction.atomic():
+        DailyRollup.objects.filter(user=user).delete()
+        DailyRollup.objects.bulk_create(rollups.values(), batch_size=500)
+
+    return len(rollups)
+
+
+def get_daily_rollups(user: User, start, end):
+    # rollups for every day in [start, end], keyed by day
+    return {rollup.day: rollup for rollup in DailyRollup.objects.filter(user=user, day__range=(start, end))}
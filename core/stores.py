@@ -0,0 +1,58 @@
+from django.utils import timezone
+
+from .models import StoreLocation
+
+
+def location_key(latitude, longitude, full_address):
+    return latitude, longitude, full_address
+
+
+def canonical_locations(results):
+    """
+    Maps lookup results of Location.get_nearest_locations to rows of the
+    shared StoreLocation catalog, creating the places not in it yet. Keyed
+    by location_key; results without coordinates are left out.
+    """
+    results = {location_key(result['latitude'], result['longitude'], result['full_address']): result
+               for result in results if result['latitude'] is not None}
+    if not results:
+        return {}
+
+    def existing():
+        locations = StoreLocation.objects.filter(full_address__in={key[2] for key in results})
+        return {key: location for location in locations
+                if (key := location_key(location.latitude, location.longitude, location.full_address)) in results}
+
+    locations = existing()
+    missing = [key for key in results if key not in locations]
+    if missing:
+        # conflicts are places another worker added in the meantime, they are re-read below
+        StoreLocation.objects.bulk_create([
+            StoreLocation(
+                name=results[key].get('name'),
+                address=results[key]['address'],
+                full_address=results[key]['full_address'],
+                latitude=results[key]['latitude'],
+                longitude=results[key]['longitude'],
+            )
+            for key in missing
+        ], ignore_conflicts=True)
+        locations = existing()
+    return locations
+
+
+def assign_store_locations(stores, addresses):
+    """
+    Points every store at its catalog location and sets its distance from
+    `addresses`, the result of Location.get_nearest_locations keyed by store
+    name. The stores are not saved.
+    """
+    locations = canonical_locations(addresses.values())
+    now = timezone.now()
+    for store in stores:
+        # bulk_update does not touch auto_now fields, the changes feed relies on updated_at
+        store.updated_at = now
+        result = addresses[store.name]
+        store.location = locations.get(location_key(result['latitude'], result['longitude'], result['full_address']))
+        store.distance = result['distance']
+    return stores
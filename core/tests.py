@@ -1,3 +1,1021 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import urlparse, parse_qs
 
-# Create your tests here.
+import requests
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core import jobs
+from core.api import location
+from core.api.geocoding import GeocodingClient
+from core.api.poi_index import reset_poi_index
+from core.api.views import (get_day_range, todays_intake_data, top_foods_data, weekly_comparison_data,
+                             yearly_water_chart_data)
+from core.exports import EXPORT_RETENTION
+from core.purge import purge_user
+from core.models import User, FoodEntry, WaterEntry, Store, StoreLocation, Job, Goal, DailyRollup, DataExport
+from core.rollups import rebuild_daily_rollups
+
+
+class EntryReadQueryCountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='reader@example.com', username='reader')
+        self.client.force_login(self.user)
+        self.today = timezone.localdate().strftime('%Y-%m-%d')
+
+    def add_entries(self, count):
+        for i in range(count):
+            store = Store.objects.create(user=self.user, name=f'Store {i}', visits=1)
+            FoodEntry.objects.create(user=self.user, food_name=f'Food {i}', calories=100, purchased=True,
+                                     purchased_from=store)
+            WaterEntry.objects.create(user=self.user, amount=250)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.json()
+
+    def assert_constant_queries(self, url):
+        self.add_entries(1)
+        few_queries, few_entries = self.count_queries(url)
+        self.add_entries(25)
+        many_queries, many_entries = self.count_queries(url)
+
+        self.assertEqual((len(few_entries), len(many_entries)), (1, 26))
+        self.assertEqual(few_queries, many_queries)
+        return many_entries
+
+    def test_food_entries_get_is_constant_queries(self):
+        entries = self.assert_constant_queries(f'/api/food-entries/{self.today}/')
+        self.assertTrue(all(entry['store'].startswith('Store ') for entry in entries))
+
+    def test_water_entries_get_is_constant_queries(self):
+        entries = self.assert_constant_queries(f'/api/water-entries/{self.today}/')
+        self.assertEqual({entry['amount'] for entry in entries}, {250})
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='dashboard@example.com', username='dashboard')
+        self.client.force_login(self.user)
+        self.today = date.today()
+        self.today_start = get_day_range(self.today)[0]
+        self.yesterday_start = get_day_range(self.today - timedelta(days=1))[0]
+
+    def log_food(self, start, calories, health_rating='2', store=None):
+        FoodEntry.objects.create(user=self.user, food_name='Soup', calories=calories, health_rating=health_rating,
+                                 purchased_from=store, created_at=start + timedelta(hours=1))
+
+    def log_water(self, *days_and_amounts):
+        for day, amount in days_and_amounts:
+            WaterEntry.objects.create(user=self.user, amount=amount,
+                                      created_at=get_day_range(day)[0] + timedelta(hours=12))
+        rebuild_daily_rollups(self.user)
+
+    def test_todays_intake_card(self):
+        corner = Store.objects.create(user=self.user, name='Corner', visits=1)
+        kiosk = Store.objects.create(user=self.user, name='Kiosk', visits=1)
+        for start, amount in [(self.today_start, 300), (self.today_start, 500), (self.yesterday_start, 400)]:
+            WaterEntry.objects.create(user=self.user, amount=amount, created_at=start + timedelta(hours=1))
+        self.log_food(self.today_start, 100, health_rating='3', store=corner)
+        self.log_food(self.today_start, 200)
+        self.log_food(self.yesterday_start, 150, store=kiosk)
+        # a new store bought from today is not counted as yesterday's new store as well
+        self.log_food(self.yesterday_start, 50, store=corner)
+
+        with self.assertNumQueries(2):
+            data = todays_intake_data(self.user, self.today)
+
+        self.assertEqual(data, {
+            'today_water_intake': 800, 'water_change_percentage': 100,
+            'today_calorie_intake': 300, 'calorie_change_percentage': 50,
+            'today_healthy_food_count': 1, 'healthy_food_change_percentage': 100,
+            'today_new_store_count': 1, 'new_store_change_percentage': 0,
+        })
+
+    def test_top_foods_break_ties_by_name(self):
+        foods = [('Soup', 100, {}), ('Soup', 300, {}), ('Soup', 200, {}), ('Bread', 150, {}), ('Bread', 150, {}),
+                 ('Apple', 50, {}), ('Apple', 80, {}), ('Cake', 400, {})]
+        # quick-add foods and deleted entries are not counted
+        foods += [('MyShake', 250, {'is_quick_add': True})] * 5 + [('Salad', 90, {'is_active': False})] * 5
+        for name, calories, fields in foods:
+            FoodEntry.objects.create(user=self.user, food_name=name, calories=calories, **fields)
+
+        with self.assertNumQueries(1):
+            top_foods = top_foods_data(self.user, 3)
+
+        self.assertEqual(top_foods, [
+            {'id': '01', 'name': 'Soup', 'frequency': 3, 'max_calorie': 300, 'min_calorie': 100},
+            {'id': '02', 'name': 'Apple', 'frequency': 2, 'max_calorie': 80, 'min_calorie': 50},
+            {'id': '03', 'name': 'Bread', 'frequency': 2, 'max_calorie': 150, 'min_calorie': 150},
+        ])
+
+    def test_weekly_comparison_splits_the_weeks_at_seven_days(self):
+        today = date(2025, 3, 12)
+        self.log_water((date(2025, 2, 26), 900), (date(2025, 2, 27), 300), (date(2025, 3, 5), 200),
+                       (date(2025, 3, 6), 100), (date(2025, 3, 12), 50))
+
+        with self.assertNumQueries(1):
+            data = weekly_comparison_data(self.user, today)
+
+        this_week, last_week = data[1]['data'], data[4]['data']
+        self.assertEqual((data[0], data[3]), ({'tag': 'This Week'}, {'tag': 'Last Week'}))
+        self.assertEqual([(day['date'], day['total']) for day in this_week],
+                         [('Thursday', 100), ('Friday', 0), ('Saturday', 0), ('Sunday', 0), ('Monday', 0),
+                          ('Tuesday', 0), ('Wednesday', 50)])
+        # last week runs backwards from the day before this week starts
+        self.assertEqual([(day['date'], day['total']) for day in last_week],
+                         [('Wednesday', 200), ('Tuesday', 0), ('Monday', 0), ('Sunday', 0), ('Saturday', 0),
+                          ('Friday', 0), ('Thursday', 300)])
+        self.assertEqual((data[2], data[5]), ({'total': 150}, {'total': 500}))
+
+    def test_yearly_water_chart_fills_months_without_water(self):
+        today = date(2025, 3, 12)
+        self.log_water((date(2024, 3, 31), 900), (date(2024, 4, 1), 100), (date(2024, 5, 20), 300),
+                       (date(2025, 3, 1), 150), (date(2025, 3, 12), 50), (date(2025, 4, 1), 900))
+
+        with self.assertNumQueries(1):
+            data = yearly_water_chart_data(self.user, today)
+
+        self.assertEqual([month['month'] for month in data['this_year_data']],
+                         ['April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December',
+                          'January', 'February', 'March'])
+        self.assertEqual([month['intake'] for month in data['this_year_data']],
+                         [100, 300, 0, 0, 0, 0, 0, 0, 0, 0, 0, 200])
+        self.assertEqual(data['total_this_year'], 600)
+
+    def test_dashboard_returns_every_card(self):
+        Store.objects.create(user=self.user, name='Aldi', visits=3)
+        Goal.objects.create(user=self.user, water_goal=3000)
+        self.log_food(self.today_start, 100)
+        self.client.post('/api/water-entries/', {'amount': 250}, content_type='application/json')
+
+        response = self.client.get('/api/dashboard/')
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(set(data), {'todays_intake', 'top_n_foods', 'top_n_stores', 'weekly_comparison',
+                                     'yearly_water_chart', 'today_water_chart'})
+        self.assertEqual(data['todays_intake']['today_water_intake'], 250)
+        self.assertEqual([food['name'] for food in data['top_n_foods']], ['Soup'])
+        self.assertEqual([store['name'] for store in data['top_n_stores']], ['Aldi'])
+        self.assertEqual(data['weekly_comparison'][2], {'total': 250})
+        self.assertEqual(data['yearly_water_chart']['total_this_year'], 250)
+        self.assertEqual((data['today_water_chart']['today_intake'], data['today_water_chart']['goal']), (250, 3000))
+
+    def test_dashboard_returns_selected_cards(self):
+        for i in range(3):
+            Store.objects.create(user=self.user, name=f'Store {i}', visits=1)
+
+        response = self.client.get('/api/dashboard/?cards=top_n_stores, todays_intake&stores=2')
+
+        self.assertEqual(set(response.json()), {'top_n_stores', 'todays_intake'})
+        self.assertEqual(len(response.json()['top_n_stores']), 2)
+
+    def test_dashboard_rejects_unknown_cards(self):
+        response = self.client.get('/api/dashboard/?cards=todays_intake,horoscope')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('horoscope', response.json()['error'])
+
+    def test_dashboard_rejects_bad_counts(self):
+        for query in ['foods=-1', 'stores=-1', 'foods=many', 'stores=100000']:
+            self.assertEqual(self.client.get(f'/api/dashboard/?{query}').status_code, 400, query)
+
+
+class WeeklyDataTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='weekly@example.com', username='weekly')
+        self.client.force_login(self.user)
+        self.today = date.today()
+
+    def log_food(self, days_ago, name, store=None):
+        start = get_day_range(self.today - timedelta(days=days_ago))[0]
+        FoodEntry.objects.create(user=self.user, food_name=name, calories=100, purchased_from=store,
+                                 created_at=start + timedelta(hours=1))
+
+    def test_entries_are_bucketed_by_day_in_one_query(self):
+        store = Store.objects.create(user=self.user, name='Aldi', visits=2)
+        self.log_food(0, 'Soup', store)
+        self.log_food(0, 'Bread')
+        self.log_food(2, 'Salad', store)
+        # outside the window
+        self.log_food(3, 'Cake')
+
+        with self.assertNumQueries(3):
+            # the session, the user and the entries
+            response = self.client.get('/api/weekly-data/3/')
+
+        days = response.json()
+        self.assertEqual([day['date'] for day in days],
+                         [(self.today - timedelta(days=i)).strftime('%Y-%m-%d') for i in (2, 1, 0)])
+        self.assertEqual([[(entry['foodName'], entry['store']) for entry in day['entries']] for day in days],
+                         [[('Salad', 'Aldi')], [], [('Soup', 'Aldi'), ('Bread', None)]])
+
+    def test_days_back_is_bounded(self):
+        self.assertEqual(self.client.get('/api/weekly-data/400/').status_code, 200)
+        self.assertEqual(self.client.get('/api/weekly-data/401/').status_code, 400)
+
+
+class FoodDatabaseTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='pantry@example.com', username='pantry')
+        self.client.force_login(self.user)
+        now = timezone.now()
+        for i, (name, calories) in enumerate([('Soup', 100), ('Soup', 120), ('Sourdough', 250), ('Salad', 80),
+                                              ('Éclair', 300), ('Ökomüsli', 350), ('Tea🍵', 5)]):
+            FoodEntry.objects.create(user=self.user, food_name=name, calories=calories,
+                                     created_at=now - timedelta(minutes=10 - i))
+
+    def names(self, query=''):
+        response = self.client.get(f'/api/food-database/{query}')
+        self.assertEqual(response.status_code, 200)
+        return [(food['name'], food['calories']) for food in response.json()]
+
+    def test_only_the_latest_entry_of_each_food_is_returned(self):
+        foods = self.names()
+
+        self.assertEqual(len(foods), 6)
+        self.assertIn(('Soup', 120), foods)
+
+    def test_foods_are_searched_by_prefix(self):
+        self.assertEqual(self.names('?q=SO'), [('Soup', 120), ('Sourdough', 250)])
+        # characters outside the basic multilingual plane after the prefix
+        self.assertEqual(self.names('?q=tea'), [('Tea🍵', 5)])
+        self.assertEqual(self.names('?q=Éc'), [('Éclair', 300)])
+        self.assertEqual(self.names('?q=Ökom'), [('Ökomüsli', 350)])
+
+    def test_search_uses_the_lowercased_name_index(self):
+        with CaptureQueriesContext(connection) as context:
+            self.names('?q=so')
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {context.captured_queries[-1]['sql']}")
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+
+        self.assertIn('foodentry_user_lower_name_idx', plan)
+
+    def test_limit_caps_the_number_of_foods(self):
+        self.assertEqual(len(self.names('?q=s&limit=2')), 2)
+        self.assertEqual(self.client.get('/api/food-database/?limit=all').status_code, 400)
+
+
+class DailyRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='rollups@example.com', username='rollups')
+        self.client.force_login(self.user)
+        self.today = timezone.localdate()
+        self.yesterday = self.today - timedelta(days=1)
+
+    def log_meal(self, entry_id='meal-1', calories=500):
+        self.client.post('/api/food-entries/add/', {'id': entry_id, 'foodName': 'Burger', 'calories': calories,
+                                                    'healthRating': '3', 'protein': 20},
+                         content_type='application/json')
+
+    def rollup(self, day):
+        return DailyRollup.objects.filter(user=self.user, day=day).values(
+            'water_total', 'water_entry_count', 'calories', 'protein', 'healthy_count', 'food_entry_count').first()
+
+    def test_logging_entries_creates_the_rollup(self):
+        self.log_meal()
+        self.client.post('/api/water-entries/', {'amount': 250}, content_type='application/json')
+
+        self.assertEqual(self.rollup(self.today), {'water_total': 250, 'water_entry_count': 1, 'calories': 500,
+                                                   'protein': 20, 'healthy_count': 1, 'food_entry_count': 1})
+
+    def test_relogging_an_entry_moves_it_to_today(self):
+        FoodEntry.objects.create(user=self.user, entry_id='meal-1', food_name='Burger', calories=500, frequency=1,
+                                 created_at=get_day_range(self.yesterday)[0] + timedelta(hours=12))
+        rebuild_daily_rollups(self.user)
+        self.assertEqual(self.rollup(self.yesterday)['calories'], 500)
+
+        self.log_meal(calories=600)
+
+        self.assertIsNone(self.rollup(self.yesterday))
+        self.assertEqual(self.rollup(self.today)['calories'], 600)
+
+    def test_deleting_the_last_entry_removes_the_rollup(self):
+        self.client.post('/api/water-entries/', {'amount': 250}, content_type='application/json')
+        entry = WaterEntry.objects.get(user=self.user)
+
+        self.client.delete(f'/api/water-entries/delete/{entry.entry_id}/')
+
+        self.assertIsNone(self.rollup(self.today))
+
+    def test_import_rebuilds_the_rollups(self):
+        self.log_meal()
+        data = {'water_entries': [{'amount': 500, 'created_at': 'Monday, March 03, 2025 07:15 PM'},
+                                  {'amount': 250, 'created_at': 'Monday, March 03, 2025 08:15 PM'}]}
+
+        self.client.post('/api/import-data/', data, content_type='application/json')
+
+        self.assertEqual(list(DailyRollup.objects.filter(user=self.user).values_list('day', 'water_total')),
+                         [(date(2025, 3, 3), 750)])
+
+    def test_rebuild_matches_the_refreshed_rollups(self):
+        self.log_meal('meal-1')
+        self.log_meal('meal-2', calories=300)
+        for amount in [250, 500]:
+            self.client.post('/api/water-entries/', {'amount': amount}, content_type='application/json')
+        refreshed = self.rollup(self.today)
+
+        call_command('rebuild_rollups', stdout=io.StringIO())
+
+        self.assertEqual(self.rollup(self.today), refreshed)
+        self.assertEqual((refreshed['water_total'], refreshed['calories']), (750, 800))
+
+    def test_inactive_water_is_left_out_of_every_card(self):
+        Goal.objects.create(user=self.user, water_goal=3000)
+        for amount, is_active in [(500, True), (300, False)]:
+            WaterEntry.objects.create(user=self.user, amount=amount, is_active=is_active)
+        rebuild_daily_rollups(self.user)
+
+        data = self.client.get('/api/dashboard/?cards=todays_intake,today_water_chart').json()
+
+        self.assertEqual(data['todays_intake']['today_water_intake'], 500)
+        self.assertEqual(data['today_water_chart']['today_intake'], 500)
+
+
+class NominatimStub:
+    """
+    Local stand-in for the Nominatim search endpoint. Addresses geocode to a
+    fixed point and store searches return two candidates near it.
+    """
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                stub.requests.append((query['q'][0], self.client_address))
+                time.sleep(stub.delay)
+                body = json.dumps(stub.results(query)).encode()
+                try:
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client timed out and closed the connection
+                    self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/search'
+
+    @staticmethod
+    def results(query):
+        if 'viewbox' not in query:
+            return [{'lat': '35.3074', 'lon': '-80.7352', 'display_name': query['q'][0]}]
+        return [
+            {'lat': '35.3500', 'lon': '-80.7000', 'display_name': f"{query['q'][0]}, 2 Far Rd, Charlotte, NC"},
+            {'lat': '35.3100', 'lon': '-80.7400', 'display_name': f"{query['q'][0]}, 1 Near St, Charlotte, NC"},
+        ]
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def client(self, **options):
+        return GeocodingClient(search_url=self.url, **{'rate_limit': 100, **options})
+
+
+class GeocodingClientTests(TestCase):
+    def test_searches_reuse_one_pooled_connection(self):
+        with NominatimStub() as stub:
+            client = stub.client()
+            for store in ['Walmart', 'Target', 'Costco']:
+                client.search(store)
+
+        self.assertEqual(len({address for _, address in stub.requests}), 1)
+
+    def test_slow_responses_time_out(self):
+        with NominatimStub(delay=1) as stub:
+            client = stub.client(read_timeout=0.1)
+            with self.assertRaises(requests.Timeout):
+                client.search('Walmart')
+
+    def test_identical_in_flight_searches_are_coalesced(self):
+        with NominatimStub(delay=0.3) as stub:
+            client = stub.client()
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(client.search('Walmart'))) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(stub.requests), 1)
+        self.assertEqual(len(results), 5)
+
+    def test_requests_are_rate_limited(self):
+        with NominatimStub() as stub:
+            client = stub.client(rate_limit=10)
+            start = time.monotonic()
+            for store in ['Walmart', 'Target', 'Costco']:
+                client.search(store)
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    def test_nearest_location_is_served_from_cache(self):
+        location.memory_cache.clear()
+        with NominatimStub() as stub, mock.patch.object(location, 'geocoding_client', stub.client()):
+            first = location.Location.get_nearest_location('9201 University City Blvd, Charlotte, NC', 'Walmart')
+            location.memory_cache.clear()
+            second = location.Location.get_nearest_location('9201 university city blvd,  charlotte, nc', 'Walmart')
+
+        self.assertEqual(len(stub.requests), 2)
+        self.assertEqual(first, second)
+        self.assertEqual(first['full_address'], 'Walmart  1 Near St  Charlotte  NC')
+
+    def test_nearest_locations_geocode_the_address_once(self):
+        location.memory_cache.clear()
+        stores = ['Walmart', 'Target', 'Costco', 'Aldi']
+        with NominatimStub(delay=0.1) as stub, mock.patch.object(location, 'geocoding_client', stub.client()):
+            nearest = location.Location.get_nearest_locations('9201 University City Blvd, Charlotte, NC', stores)
+
+        searched = [query for query, _ in stub.requests]
+        self.assertEqual(searched.count('9201 University City Blvd, Charlotte, NC'), 1)
+        self.assertEqual(sorted(searched[1:]), sorted(stores))
+        self.assertEqual(set(nearest), set(stores))
+        self.assertTrue(all(result['distance'] > 0 for result in nearest.values()))
+
+
+class StoreLocationJobTests(TestCase):
+    def setUp(self):
+        location.memory_cache.clear()
+        self.user = User.objects.create(email='shopper@example.com', username='shopper',
+                                        full_address='9201 University City Blvd, Charlotte, NC')
+        self.client.force_login(self.user)
+
+    def log_meal(self):
+        with mock.patch.object(location.geocoding_client, 'search') as search:
+            self.client.post('/api/food-entries/add/', {'id': 'meal-1', 'foodName': 'Burger', 'calories': 500,
+                                                        'store': 'Walmart'}, content_type='application/json')
+        search.assert_not_called()
+        return Store.objects.get(user=self.user, name='Walmart')
+
+    def test_new_store_is_located_by_the_worker(self):
+        store = self.log_meal()
+        self.assertEqual((store.location_status, store.location), ('pending', None))
+
+        with NominatimStub() as stub, mock.patch.object(location, 'geocoding_client', stub.client()):
+            self.assertEqual(jobs.run_pending_jobs(), 1)
+
+        store.refresh_from_db()
+        self.assertEqual(store.location_status, 'located')
+        self.assertEqual(store.distance, 0.52)
+        self.assertEqual(Job.objects.get().status, 'done')
+        self.assertEqual(store.location.full_address, 'Walmart  1 Near St  Charlotte  NC')
+
+    def test_users_nearby_share_searches_and_store_locations(self):
+        neighbour = User.objects.create(email='neighbour@example.com', username='neighbour',
+                                        full_address='9210 University City Blvd, Charlotte, NC')
+        self.log_meal()
+        self.client.force_login(neighbour)
+        with mock.patch.object(location.geocoding_client, 'search'):
+            self.client.post('/api/food-entries/add/', {'id': 'meal-2', 'foodName': 'Fries', 'calories': 300,
+                                                        'store': 'Walmart'}, content_type='application/json')
+
+        with NominatimStub() as stub, mock.patch.object(location, 'geocoding_client', stub.client()):
+            self.assertEqual(jobs.run_pending_jobs(), 2)
+
+        # both addresses geocode to the same point in the stub, so Walmart is only searched once
+        self.assertEqual([query for query, _ in stub.requests].count('Walmart'), 1)
+        self.assertEqual(StoreLocation.objects.count(), 1)
+        self.assertEqual(Store.objects.filter(location=StoreLocation.objects.get()).count(), 2)
+
+    def test_failed_lookups_are_retried_with_backoff(self):
+        store = self.log_meal()
+        failing = mock.Mock(search=mock.Mock(side_effect=requests.ConnectionError('offline')))
+
+        with mock.patch.object(location, 'geocoding_client', failing):
+            jobs.run_pending_jobs()
+            job = Job.objects.get()
+            self.assertEqual((job.status, job.attempts), ('pending', 1))
+            self.assertGreater(job.run_after, timezone.now())
+
+            Job.objects.update(run_after=timezone.now(), attempts=job.max_attempts - 1)
+            jobs.run_pending_jobs()
+
+        store.refresh_from_db()
+        self.assertEqual(Job.objects.get().status, 'failed')
+        self.assertEqual(store.location_status, 'failed')
+
+    def test_jobs_of_dead_workers_are_run_again(self):
+        store = self.log_meal()
+        job = jobs.claim_next_job()
+        # the worker died with the job claimed
+        Job.objects.filter(id=job.id).update(updated_at=timezone.now() - jobs.JOB_LEASE_TIMEOUT * 2)
+
+        with NominatimStub() as stub, mock.patch.object(location, 'geocoding_client', stub.client()):
+            self.assertEqual(jobs.run_pending_jobs(), 1)
+
+        job.refresh_from_db()
+        store.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('done', 2))
+        self.assertEqual(store.location_status, 'located')
+
+    def test_finished_jobs_are_pruned(self):
+        self.log_meal()
+        Job.objects.update(status='done', updated_at=timezone.now() - jobs.DONE_JOB_RETENTION * 2)
+        jobs.enqueue('locate_store', {'store_id': 0})
+
+        call_command('run_jobs', once=True, stdout=io.StringIO())
+
+        self.assertEqual(list(Job.objects.values_list('status', flat=True)), ['done'])
+        self.assertEqual(Job.objects.get().payload, {'store_id': 0})
+
+
+class PoiIndexTests(TestCase):
+    def setUp(self):
+        location.memory_cache.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        extract = os.path.join(self.directory.name, 'pois.csv')
+        with open(extract, 'w') as file:
+            file.write('name,brand,lat,lon,addr:housenumber,addr:street,addr:city,addr:state\n'
+                       'Walmart Supercenter,Walmart,35.3500,-80.7000,2,Far Rd,Charlotte,NC\n'
+                       'Walmart Supercenter,Walmart,35.3100,-80.7400,1,Near St,Charlotte,NC\n'
+                       'Walmart Supercenter,Walmart,40.7128,-74.0060,9,Broadway,New York,NY\n'
+                       'Target,,35.3200,-80.7200,5,Mid Ave,Charlotte,NC\n')
+        self.index_path = os.path.join(self.directory.name, 'poi_index.pickle')
+        call_command('import_pois', extract, output=self.index_path, stdout=open(os.devnull, 'w'))
+        reset_poi_index()
+        self.addCleanup(reset_poi_index)
+
+    def test_nearest_store_is_answered_from_the_index(self):
+        with NominatimStub() as stub, mock.patch.object(location, 'geocoding_client', stub.client()), \
+                override_settings(LOCATION_BACKEND='poi_index', POI_INDEX_PATH=self.index_path):
+            nearest = location.Location.get_nearest_locations('9201 University City Blvd, Charlotte, NC',
+                                                              ['Walmart', 'target', 'Costco'])
+
+        # only the origin address is geocoded online
+        self.assertEqual([query for query, _ in stub.requests], ['9201 University City Blvd, Charlotte, NC'])
+        self.assertEqual(nearest['Walmart']['full_address'], 'Walmart Supercenter  1 Near St  Charlotte  NC')
+        self.assertEqual(nearest['Walmart']['distance'], 0.52)
+        self.assertEqual(nearest['target']['address'], ' 5 Mid Ave  Charlotte')
+        self.assertEqual(nearest['Costco']['address'], 'Not nearby')
+
+    def test_missing_index_is_reported_per_store(self):
+        missing = os.path.join(self.directory.name, 'missing.pickle')
+        with NominatimStub() as stub, mock.patch.object(location, 'geocoding_client', stub.client()), \
+                override_settings(LOCATION_BACKEND='poi_index', POI_INDEX_PATH=missing):
+            nearest = location.Location.get_nearest_locations('9201 University City Blvd, Charlotte, NC',
+                                                              ['Walmart'])
+            with self.assertRaisesMessage(FileNotFoundError, 'import_pois'):
+                location.Location.get_nearest_locations('9201 University City Blvd, Charlotte, NC', ['Walmart'],
+                                                        raise_errors=True)
+
+        self.assertTrue(nearest['Walmart']['address'].startswith('POI index unavailable'))
+        self.assertIsNone(nearest['Walmart']['latitude'])
+
+
+class NearbyStoresTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='nearby@example.com', username='nearby')
+        self.client.force_login(self.user)
+        for name, lat, lon in [('Near', 35.3100, -80.7400), ('Far', 35.3500, -80.7000),
+                               ('Elsewhere', 40.7128, -74.0060)]:
+            place = StoreLocation.objects.create(name=name, full_address=name, latitude=lat, longitude=lon)
+            Store.objects.create(user=self.user, name=name, visits=1, location=place)
+        Store.objects.create(user=self.user, name='Unlocated', visits=1)
+
+    def test_stores_within_radius_are_sorted_by_distance(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/stores/nearby/?radius=10&lat=35.3074&lon=-80.7352')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([store['name'] for store in response.json()], ['Near', 'Far'])
+        self.assertEqual(response.json()[0]['distance'], 0.52)
+        self.assertEqual(len([query for query in context.captured_queries if 'core_store' in query['sql']]), 1)
+
+    def test_radius_must_be_a_number(self):
+        response = self.client.get('/api/stores/nearby/?radius=far&lat=35.3&lon=-80.7')
+        self.assertEqual(response.status_code, 400)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='exporter@example.com', username='exporter')
+        self.client.force_login(self.user)
+        store = Store.objects.create(user=self.user, name='Aldi', visits=2)
+        for i in range(5):
+            WaterEntry.objects.create(user=self.user, amount=250 + i)
+            FoodEntry.objects.create(user=self.user, food_name=f'Food {i}', calories=100, purchased_from=store)
+
+    def export(self, query=''):
+        response = self.client.get(f'/api/export-data/{query}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_json_export_keeps_the_section_layout(self):
+        data = json.loads(self.export())
+
+        self.assertEqual(list(data), ['user', 'profile', 'stores', 'water_entries', 'food_entries', 'goals',
+                                      'water_containers'])
+        self.assertEqual(data['profile'], [None])
+        self.assertEqual([entry['amount'] for entry in data['water_entries']], [250, 251, 252, 253, 254])
+        self.assertEqual({entry['purchased_from'] for entry in data['food_entries']}, {'Aldi'})
+
+    def test_ndjson_export_has_one_record_per_line(self):
+        lines = [json.loads(line) for line in self.export('?output=ndjson').splitlines()]
+
+        self.assertEqual(len(lines), 1 + 5 + 5 + 1)
+        self.assertEqual(lines[2], {'section': 'water_entries',
+                                    'record': {'amount': 250, 'created_at': lines[2]['record']['created_at']}})
+
+    def test_export_reads_entries_in_constant_queries(self):
+        with CaptureQueriesContext(connection) as few:
+            self.export()
+        for i in range(20):
+            FoodEntry.objects.create(user=self.user, food_name=f'More {i}', calories=100,
+                                     purchased_from=Store.objects.get())
+        with CaptureQueriesContext(connection) as many:
+            self.export()
+
+        self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='importer@example.com', username='importer')
+        self.client.force_login(self.user)
+
+    def import_file(self, data):
+        return self.client.post('/api/import-data/', data, content_type='application/json')
+
+    def export_file(self, food_entries=3):
+        return {
+            'profile': [None],
+            'goals': [{'water_goal': 3000, 'created_at': 'Monday, March 03, 2025 07:15 PM'}],
+            'stores': [{'name': 'Aldi', 'address': 'Anywhere', 'visits': 2,
+                        'created_at': 'Monday, March 03, 2025 07:15 PM'}],
+            'water_entries': [{'amount': 500, 'created_at': 'Monday, March 03, 2025 07:15 PM'}],
+            'food_entries': [{'food_name': f'Food {i}', 'calories': 100, 'purchased_from': 'Aldi',
+                              'created_at': 'Tuesday, March 04, 2025 12:05 AM'} for i in range(food_entries)],
+        }
+
+    def test_import_links_entries_to_imported_stores(self):
+        response = self.import_file(self.export_file())
+
+        self.assertEqual(response.json(), {'success': True})
+        store = Store.objects.get(user=self.user)
+        self.assertEqual(store.location_status, 'pending')
+        self.assertEqual(FoodEntry.objects.filter(user=self.user, purchased_from=store).count(), 3)
+        self.assertEqual(FoodEntry.objects.filter(user=self.user).first().created_at,
+                         datetime(2025, 3, 4, 0, 5, tzinfo=dt_timezone.utc))
+        self.assertEqual(Job.objects.filter(kind='locate_store').count(), 1)
+
+    def test_import_inserts_in_batches(self):
+        # each import replaces the same three entries of the previous one
+        self.import_file(self.export_file(food_entries=3))
+        with CaptureQueriesContext(connection) as few:
+            self.import_file(self.export_file(food_entries=3))
+        with CaptureQueriesContext(connection) as many:
+            self.import_file(self.export_file(food_entries=300))
+
+        # SQLite caps the parameters of one statement, so 300 entries take a handful of INSERTs
+        self.assertLess(len(many.captured_queries) - len(few.captured_queries), 10)
+
+    def test_failed_import_keeps_existing_data(self):
+        WaterEntry.objects.create(user=self.user, amount=250)
+        data = self.export_file()
+        data['food_entries'].append({'food_name': 'Broken', 'calories': 'lots'})
+
+        response = self.import_file(data)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(WaterEntry.objects.filter(user=self.user).values_list('amount', flat=True)), [250])
+        self.assertFalse(Store.objects.filter(user=self.user).exists())
+
+    def test_invalid_field_values_are_rejected(self):
+        WaterEntry.objects.create(user=self.user, amount=250)
+        invalid = [{'water_entries': [{'amount': 1, 'is_active': 'maybe'}]},
+                   # a user has a single goal
+                   {'goals': [{'water_goal': 3000}, {'water_goal': 2000}]}]
+        for data in invalid:
+            response = self.import_file(data)
+
+            self.assertEqual(response.status_code, 400, data)
+            self.assertEqual(list(WaterEntry.objects.filter(user=self.user).values_list('amount', flat=True)), [250])
+
+    def ndjson_file(self):
+        lines = [{'section': section, 'record': record}
+                 for section, records in self.export_file().items() for record in records if record is not None]
+        return ''.join(json.dumps(line) + '\n' for line in lines)
+
+    def test_ndjson_body_is_imported(self):
+        response = self.client.post('/api/import-data/', self.ndjson_file(), content_type='application/x-ndjson')
+
+        self.assertEqual(response.json(), {'success': True})
+        self.assertEqual(FoodEntry.objects.filter(user=self.user, purchased_from__name='Aldi').count(), 3)
+        self.assertEqual(WaterEntry.objects.get(user=self.user).amount, 500)
+
+    def test_ndjson_upload_is_imported_in_batches(self):
+        upload = SimpleUploadedFile('backup.ndjson', self.ndjson_file().encode())
+        with mock.patch('core.imports.IMPORT_BATCH_SIZE', 2), \
+                mock.patch.object(FoodEntry.objects, 'bulk_create', wraps=FoodEntry.objects.bulk_create) as bulk:
+            response = self.client.post('/api/import-data/', {'file': upload})
+
+        self.assertEqual(response.json(), {'success': True})
+        self.assertEqual([len(call.args[0]) for call in bulk.call_args_list], [2, 1])
+
+    def test_malformed_ndjson_line_is_rejected(self):
+        WaterEntry.objects.create(user=self.user, amount=250)
+        body = self.ndjson_file() + '{"section": "water_entries"\n'
+
+        response = self.client.post('/api/import-data/', body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('line 7', response.json()['error'])
+        self.assertEqual(WaterEntry.objects.get(user=self.user).amount, 250)
+
+
+class CompactExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='compact@example.com', username='compact')
+        self.client.force_login(self.user)
+        store = Store.objects.create(user=self.user, name='Aldi', visits=2)
+        self.created_at = datetime(2025, 3, 3, 19, 15, 42, 123456, tzinfo=dt_timezone.utc)
+        WaterEntry.objects.create(user=self.user, amount=250, created_at=self.created_at, is_active=False)
+        FoodEntry.objects.create(user=self.user, food_name='Soup', calories=100, purchased_from=store,
+                                 created_at=self.created_at)
+
+    def export(self, query='?output=compact', headers=None):
+        response = self.client.get(f'/api/export-data/{query}', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_compact_export_round_trips_losslessly(self):
+        _, body = self.export()
+        data = json.loads(body)
+        self.assertEqual((data['format'], data['version']), ('wellness-tracker-export', 2))
+        self.assertEqual(data['sections']['water_entries']['columns'],
+                         ['entry_id', 'amount', 'is_active', 'created_at'])
+
+        response = self.client.post('/api/import-data/', data, content_type='application/json')
+
+        self.assertEqual(response.json(), {'success': True})
+        water = WaterEntry.objects.get(user=self.user)
+        self.assertEqual((water.created_at, water.is_active), (self.created_at, False))
+        self.assertEqual(FoodEntry.objects.get(user=self.user).purchased_from.name, 'Aldi')
+
+    def test_compact_import_rejects_bad_timestamps(self):
+        _, body = self.export()
+        data = json.loads(body)
+        data['sections']['water_entries']['rows'] = [['entry-1', 1, True, 'garbage']]
+
+        response = self.client.post('/api/import-data/', data, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('garbage', response.json()['error'])
+        self.assertEqual(WaterEntry.objects.get(user=self.user).created_at, self.created_at)
+
+    def test_corrupt_gzip_body_is_rejected(self):
+        compressed = gzip.compress(b'{"water_entries": [{"amount": 500}]}')
+        for body in [compressed[:10] + b'\xff' * 20 + compressed[-8:], compressed[:20], b'not gzip at all']:
+            response = self.client.post('/api/import-data/', body, content_type='application/json',
+                                        headers={'Content-Encoding': 'gzip'})
+
+            self.assertEqual(response.status_code, 400, body)
+            self.assertEqual(WaterEntry.objects.get(user=self.user).amount, 250)
+            self.assertEqual(FoodEntry.objects.get(user=self.user).food_name, 'Soup')
+
+    def test_compact_export_keeps_quick_add_foods(self):
+        FoodEntry.objects.create(user=self.user, food_name='MyShake', calories=250, is_quick_add=True)
+        FoodEntry.objects.create(user=self.user, food_name='Water Bottle', is_quick_add=True, is_default=True)
+        _, body = self.export()
+
+        response = self.client.post('/api/import-data/', json.loads(body), content_type='application/json')
+
+        self.assertEqual(response.json(), {'success': True})
+        self.assertEqual(sorted(FoodEntry.objects.filter(user=self.user).values_list('food_name', 'is_quick_add')),
+                         [('MyShake', True), ('Soup', False), ('Water Bottle', True)])
+        quick_add_foods = self.client.get('/api/quick-add-foods/').json()
+        self.assertEqual(sorted(food['foodName'] for food in quick_add_foods), ['MyShake', 'Water Bottle'])
+
+    def test_export_is_gzipped_when_accepted(self):
+        response, body = self.export(headers={'Accept-Encoding': 'gzip, deflate'})
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(body))['version'], 2)
+
+    def test_gzip_refused_with_a_zero_q_value_is_not_used(self):
+        for accept_encoding, gzipped in [('gzip;q=0', False), ('deflate, gzip; q=0.0', False),
+                                         ('identity, GZIP;q=0.5', True), ('br', False)]:
+            response, body = self.export(headers={'Accept-Encoding': accept_encoding})
+
+            self.assertEqual(response.get('Content-Encoding') == 'gzip', gzipped, accept_encoding)
+            self.assertEqual(json.loads(gzip.decompress(body) if gzipped else body)['version'], 2)
+
+    def test_compressed_download_can_be_imported(self):
+        response, body = self.export('?output=ndjson&compress=1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+
+        upload = SimpleUploadedFile('export.ndjson.gz', body)
+        response = self.client.post('/api/import-data/', {'file': upload})
+
+        self.assertEqual(response.json(), {'success': True})
+        self.assertEqual(WaterEntry.objects.get(user=self.user).amount, 250)
+
+
+class ChangesFeedTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='syncer@example.com', username='syncer')
+        self.client.force_login(self.user)
+
+    def changes(self, since=None):
+        response = self.client.get('/api/changes/', {'since': since} if since else {})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_only_rows_changed_after_the_cursor_are_returned(self):
+        first = WaterEntry.objects.create(user=self.user, amount=250)
+        WaterEntry.objects.create(user=self.user, amount=500)
+        snapshot = self.changes()
+        self.assertEqual([row['amount'] for row in snapshot['changes']['water_entries']], [250, 500])
+
+        first.is_active = False
+        first.save()
+        Goal.objects.create(user=self.user, water_goal=3000)
+        delta = self.changes(snapshot['cursor'])
+
+        self.assertEqual([(row['amount'], row['is_active']) for row in delta['changes']['water_entries']],
+                         [(250, False)])
+        self.assertEqual([row['water_goal'] for row in delta['changes']['goals']], [3000])
+        self.assertEqual(self.changes(delta['cursor'])['changes']['water_entries'], [])
+
+    def test_hard_deletes_leave_tombstones(self):
+        self.client.post('/api/water-entries/', {'amount': 250}, content_type='application/json')
+        entry = WaterEntry.objects.get(user=self.user)
+        cursor = self.changes()['cursor']
+
+        self.client.delete(f'/api/water-entries/delete/{entry.entry_id}/')
+        deleted = self.changes(cursor)['changes']['deleted']
+
+        self.assertEqual([(row['kind'], row['object_id']) for row in deleted], [('water_entries', entry.id)])
+
+    def test_feeds_are_paged(self):
+        WaterEntry.objects.bulk_create([WaterEntry(user=self.user, amount=i) for i in range(5)])
+        amounts = []
+        cursor = None
+        with mock.patch('core.changes.CHANGES_PAGE_SIZE', 2):
+            while True:
+                response = self.client.get('/api/changes/', {'since': cursor} if cursor else {}).json()
+                amounts += [row['amount'] for row in response['changes']['water_entries']]
+                cursor = response['cursor']
+                if not response['has_more']:
+                    break
+
+        self.assertEqual(sorted(amounts), [0, 1, 2, 3, 4])
+
+    def test_invalid_cursor_is_rejected(self):
+        self.assertEqual(self.client.get('/api/changes/', {'since': 'not-a-cursor'}).status_code, 400)
+
+
+class ExportJobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='archiver@example.com', username='archiver')
+        self.client.force_login(self.user)
+        WaterEntry.objects.bulk_create([WaterEntry(user=self.user, amount=250 + i) for i in range(10)])
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        settings = override_settings(MEDIA_ROOT=self.media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def finished_export(self, **options):
+        response = self.client.post('/api/export-jobs/', options, content_type='application/json')
+        self.assertEqual((response.status_code, response.json()['status']), (202, 'pending'))
+        self.assertEqual(jobs.run_pending_jobs(), 1)
+
+        status = self.client.get(f"/api/export-jobs/{response.json()['id']}/").json()
+        self.assertEqual((status['status'], status['progress']), ('done', 100))
+        return status
+
+    def test_export_is_written_in_the_background_and_downloaded(self):
+        status = self.finished_export(output='ndjson')
+
+        response = self.client.get(status['download_url'])
+
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(sum(json.loads(line)['section'] == 'water_entries' for line in lines), 10)
+
+    def test_download_supports_ranges(self):
+        status = self.finished_export(compress=True)
+        whole = b''.join(self.client.get(status['download_url']).streaming_content)
+
+        response = self.client.get(status['download_url'], headers={'Range': 'bytes=10-19'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(whole)}')
+        self.assertEqual(b''.join(response.streaming_content), whole[10:20])
+
+        response = self.client.get(status['download_url'], headers={'Range': f'bytes={len(whole)}-'})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(json.loads(gzip.decompress(whole))['water_entries'][0]['amount'], 250)
+
+    def test_exports_of_other_users_are_hidden(self):
+        status = self.finished_export()
+        self.client.force_login(User.objects.create(email='other@example.com', username='other'))
+
+        self.assertEqual(self.client.get(f"/api/export-jobs/{status['id']}/").status_code, 404)
+        self.assertEqual(self.client.get(status['download_url']).status_code, 404)
+
+    def test_export_options_can_be_form_encoded(self):
+        form = self.client.post('/api/export-jobs/', 'output=ndjson&compress=1',
+                                content_type='application/x-www-form-urlencoded')
+        multipart = self.client.post('/api/export-jobs/', {'output': 'ndjson', 'compress': '1'})
+
+        for response in [form, multipart]:
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual((response.json()['output'], response.json()['compress']), ('ndjson', True))
+
+    def test_export_options_must_be_an_object(self):
+        response = self.client.post('/api/export-jobs/', [{'output': 'ndjson'}], content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(DataExport.objects.exists())
+
+    def test_expired_exports_are_deleted(self):
+        status = self.finished_export()
+        data_export = DataExport.objects.get(id=status['id'])
+        self.assertTrue(os.path.exists(data_export.file.path))
+        DataExport.objects.update(updated_at=timezone.now() - EXPORT_RETENTION * 2)
+
+        output = io.StringIO()
+        call_command('run_jobs', once=True, stdout=output)
+
+        self.assertIn('Deleted 1 expired exports', output.getvalue())
+        self.assertFalse(os.path.exists(data_export.file.path))
+        self.assertEqual(self.client.get(status['download_url']).status_code, 404)
+
+
+class PurgeTests(TestCase):
+    def create_user(self, email, entries=5):
+        user = User.objects.create(email=email, username=email.split('@')[0])
+        store = Store.objects.create(user=user, name='Aldi', visits=entries)
+        Goal.objects.create(user=user, water_goal=3000)
+        WaterEntry.objects.bulk_create([WaterEntry(user=user, amount=250) for _ in range(entries)])
+        FoodEntry.objects.bulk_create([FoodEntry(user=user, food_name='Soup', purchased_from=store)
+                                       for _ in range(entries)])
+        return user
+
+    def test_clear_data_deletes_the_account(self):
+        user = self.create_user('leaver@example.com')
+        other = self.create_user('stayer@example.com')
+        self.client.force_login(user)
+
+        self.assertEqual(self.client.get('/api/clear-data/').json(), {'success': True})
+
+        self.assertFalse(User.objects.filter(id=user.id).exists())
+        self.assertFalse(WaterEntry.objects.filter(user_id=user.id).exists())
+        self.assertEqual(FoodEntry.objects.filter(user=other).count(), 5)
+
+    def test_tables_are_deleted_in_batches(self):
+        user = self.create_user('bulk@example.com', entries=5)
+        with CaptureQueriesContext(connection) as context:
+            counts = purge_user(user, batch_size=2)
+
+        self.assertEqual((counts['FoodEntry'], counts['WaterEntry'], counts['Store']), (5, 5, 1))
+        water_deletes = [query for query in context.captured_queries
+                         if query['sql'].startswith('DELETE FROM "core_waterentry" WHERE "core_waterentry"."id" IN')]
+        self.assertEqual(len(water_deletes), 3)
+
+    def test_purge_users_command_reports_progress(self):
+        self.create_user('one@example.com')
+        self.create_user('two@example.com')
+        output = io.StringIO()
+
+        call_command('purge_users', 'one@example.com', 'TWO@example.com', batch_size=2, stdout=output)
+
+        self.assertFalse(User.objects.exists())
+        self.assertIn('[2/2] Purged two@example.com', output.getvalue())
+        self.assertIn('Food Entries: 4 deleted', output.getvalue())
@@ -6,6 +6,8 @@ from django.utils.timezone import make_aware
 
 from .api.location import Location
 from .models import User, Profile, WaterEntry, FoodEntry, Store, Goal, WaterContainer, LocationAddress
+from .rollups import rebuild_daily_rollups
+from .stores import assign_store_locations
 
 
 def get_random_time(log_date_base):
@@ -86,17 +88,11 @@ class CreateDemoUser:
                        "7-Eleven", "CVS", "Kroger", "Aldi", "Publix", "Meijer", "Walgreens",
                        "Dollar General", "Dollar Tree", "Sprouts Farmers Market", "Giant Eagle", "H-E-B"]
 
-        stores = []
-        for name in store_names:
-            address = Location.get_nearest_location(user.full_address, name)
-            store = Store.objects.create(
-                user=user,
-                name=name,
-                address=address['address'],
-                distance=address['distance'],
-                visits=random.randint(1, 297),
-            )
-            stores.append(store)
+        addresses = Location.get_nearest_locations(user.full_address, store_names)
+        stores = Store.objects.bulk_create(assign_store_locations(
+            [Store(user=user, name=name, visits=random.randint(1, 297)) for name in store_names],
+            addresses,
+        ))
 
         # Generate food items
         food_names = ["Burger", "Salad", "Pizza", "Grilled Chicken", "Steak", "Soda", "Protein Shake",
@@ -313,4 +309,6 @@ class CreateDemoUser:
 
         WaterContainer.objects.bulk_create(water_containers)
 
+        rebuild_daily_rollups(user)
+
         print("Demo user and logs created successfully!")
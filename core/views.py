@@ -10,6 +10,8 @@ from core.forms import MyUserCreationForm
 from core.models import User, Profile, Goal, WaterContainer, Store, LocationAddress
 from .api.location import Location
 from .models import FoodEntry
+from .rollups import entry_day, refresh_daily_rollups
+from .stores import assign_store_locations
 from .utils import CreateDemoUser
 
 
@@ -137,7 +139,8 @@ def food_logging(request):
         calories = request.POST.get('calories')
 
         if food_name and calories:
-            FoodEntry.objects.create(user=request.user, food_name=food_name, calories=calories)
+            entry = FoodEntry.objects.create(user=request.user, food_name=food_name, calories=calories)
+            refresh_daily_rollups(request.user, entry_day(entry))
 
         return redirect('food_logging', context)
 
@@ -153,11 +156,10 @@ def update_profile(request):
 
 
 def update_store_locations(user, request_address):
-    for store in Store.objects.filter(user=user):
-        address = Location.get_nearest_location(request_address, store.name)
-        store.address = address['address']
-        store.distance = address['distance']
-        store.save()
+    stores = list(Store.objects.filter(user=user))
+    addresses = Location.get_nearest_locations(request_address, sorted({store.name for store in stores}))
+    assign_store_locations(stores, addresses)
+    Store.objects.bulk_update(stores, ['location', 'distance', 'updated_at'])
 
 
 def create_address(request, user):
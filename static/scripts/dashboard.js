@@ -131,19 +131,15 @@ async function updateUI() {
         const Chart = await loadChartJs(); // Await and get Chart
         await loadChartJsDatalabels();
 
-        let today_intake_endpoint = "http://localhost:8000/api/todays_intake/"
-        let top_n_foods_endpoint = "http://localhost:8000/api/top_n_foods/20"
-        let top_n_stores_endpoint = "http://localhost:8000/api/top_n_stores/10"
-        let weekly_comparison_endpoint = "http://localhost:8000/api/weekly_comparison/"
-        let yearly_water_chart_endpoint = "http://localhost:8000/api/yearly_water_chart/"
-        let today_water_chart_endpoint = "http://localhost:8000/api/today_water_chart/"
-
-        const todays_intake = await fetchDataFromApi(today_intake_endpoint);
-        const top_n_foods = await fetchDataFromApi(top_n_foods_endpoint);
-        const top_n_stores = await fetchDataFromApi(top_n_stores_endpoint);
-        const weekly_comparison = await fetchDataFromApi(weekly_comparison_endpoint);
-        const yearly_water_chart = await fetchDataFromApi(yearly_water_chart_endpoint);
-        window.today_water_chart = await fetchDataFromApi(today_water_chart_endpoint);
+        let dashboard_endpoint = "http://localhost:8000/api/dashboard/?foods=20&stores=10"
+
+        const dashboard = await fetchDataFromApi(dashboard_endpoint) || {};
+        const todays_intake = dashboard["todays_intake"];
+        const top_n_foods = dashboard["top_n_foods"];
+        const top_n_stores = dashboard["top_n_stores"];
+        const weekly_comparison = dashboard["weekly_comparison"];
+        const yearly_water_chart = dashboard["yearly_water_chart"];
+        window.today_water_chart = dashboard["today_water_chart"];
 
 
         // top left card
@@ -71,11 +71,13 @@ class StorageManager {
     }
 
     /**
-     * Gets all foods from the database
+     * Gets foods from the database, optionally filtered by a name prefix
+     * @param {string} [query] - Only return foods whose name starts with this prefix
+     * @param {number} [limit] - Maximum number of foods to return
      * @returns {Promise<Array>} - Promise resolving to an array of food names
      */
-    async getFoodDatabase() {
-        return await this.apiClient.getFoodDatabase();
+    async getFoodDatabase(query = '', limit = null) {
+        return await this.apiClient.getFoodDatabase(query, limit);
     }
 
     /**
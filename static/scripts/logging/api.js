@@ -183,10 +183,16 @@ class ApiClient {
 
     /**
      * Get the food database
+     * @param {string} [query] - Only return foods whose name starts with this prefix
+     * @param {number} [limit] - Maximum number of foods to return
      * @returns {Promise<Array>} - Promise resolving to an array of food names
      */
-    async getFoodDatabase() {
-        return await this.get('/food-database/');
+    async getFoodDatabase(query = '', limit = null) {
+        const params = new URLSearchParams();
+        if (query) params.append('q', query);
+        if (limit) params.append('limit', limit);
+        const queryString = params.toString();
+        return await this.get(`/food-database/${queryString ? `?${queryString}` : ''}`);
     }
 
     /**
@@ -344,4 +350,14 @@ class ApiClient {
     async importData(jsonData) {
         return await this.post(`/import-data/`, jsonData);
     }
+
+    /**
+     * Get the rows changed since a cursor of a previous call
+     * @param {string|null} since - cursor returned by the previous call, null for everything
+     * @returns {Promise} - Promise resolving to {changes, cursor, has_more}
+     */
+    async getChanges(since = null) {
+        const query = since ? `?since=${encodeURIComponent(since)}` : '';
+        return await this.get(`/changes/${query}`);
+    }
 }
\ No newline at end of file
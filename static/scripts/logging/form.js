@@ -105,7 +105,8 @@ class FormManager {
     async setupAutocomplete() {
         // Food name autocomplete
         this.foodNameInput.addEventListener('input', async () => {
-            let foods = await this.storageManager.getFoodDatabase();
+            const query = this.foodNameInput.value.trim();
+            let foods = query ? await this.storageManager.getFoodDatabase(query, 10) : [];
             console.log('Foods:', foods);
             this.showAutocomplete(
                 this.foodNameInput,
@@ -142,4 +142,11 @@ MEDIA_URL = '/images/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-CORS_ORIGIN_ALLOW_ALL = True
\ No newline at end of file
+CORS_ORIGIN_ALLOW_ALL = True
+
+# Store lookups: 'nominatim' searches online, 'poi_index' answers the store
+# searches from the offline index built with `manage.py import_pois <extract>`.
+# The user's own address is still geocoded through Nominatim (and cached in the
+# GeocodeCache table), so poi_index needs the network for addresses not seen before.
+LOCATION_BACKEND = os.environ.get('LOCATION_BACKEND', 'nominatim')
+POI_INDEX_PATH = BASE_DIR / 'poi_index.pickle'